@@ -10,6 +10,8 @@
   - IMAGE_GENERATION_API_KEY: API密钥 (必需)
   - IMAGE_GENERATION_API_URL: API端点 (必需)
   - IMAGE_GENERATION_MODEL: 模型名称 (可选，各后端有默认值)
+  - MINIMAX_T2I_RESPONSE_FORMAT: MiniMax返回格式 (url/base64, 默认: url)
+  - MINIMAX_T2I_CONCURRENCY: 进程内同时进行的MiniMax生成请求上限 (默认: 5, 最小为1)
 
 参数:
   - prompt(str, 必填): 图像描述文本
@@ -24,15 +26,37 @@ from __future__ import annotations
 
 from pathlib import Path
 from typing import Dict, Any, Optional, List
+from concurrent.futures import ThreadPoolExecutor
 import os
-import requests
-import base64
+import shutil
+import threading
 
 from src.tools.base import BaseAtomicTool, ToolStatus
+from src.utils import fast_base64, fast_json
+from src.utils.atomic_write import atomic_open
+from src.utils.dir_cache import ensure_dir
+from src.utils.http_session import create_session, paid_retry
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# MiniMax生成请求并发上限的默认值
+_DEFAULT_T2I_CONCURRENCY = 5
+
+
+def _t2i_concurrency() -> int:
+    """读取MINIMAX_T2I_CONCURRENCY（类定义时调用）
+
+    配置非法时回退默认值而不是让模块导入失败；0或负数按1处理，否则所有生成请求会永久阻塞。
+    """
+    raw = os.getenv("MINIMAX_T2I_CONCURRENCY", str(_DEFAULT_T2I_CONCURRENCY))
+    try:
+        value = int(raw)
+    except ValueError:
+        logger.warning(f"MINIMAX_T2I_CONCURRENCY配置无效: {raw!r}，使用默认值{_DEFAULT_T2I_CONCURRENCY}")
+        value = _DEFAULT_T2I_CONCURRENCY
+    return max(1, value)
+
 
 class ImageGeneration(BaseAtomicTool):
     name = "image_generation"
@@ -78,6 +102,13 @@ class ImageGeneration(BaseAtomicTool):
         "required": ["prompt", "conversation_id"]
     }
 
+    # 进程内同时进行的MiniMax生成请求上限（共享同一账号的速率配额，避免并发调用触发429重试风暴）
+    _MINIMAX_API_SEM = threading.BoundedSemaphore(_t2i_concurrency())
+    # 建连超时（秒）
+    _CONNECT_TIMEOUT = 10
+    # base64分块解码的字符数（4的倍数，中间块无需补齐padding）
+    _B64_CHUNK_CHARS = 4 * 65536
+
     def __init__(self, config, conv_manager=None):
         super().__init__(config)
 
@@ -106,13 +137,43 @@ class ImageGeneration(BaseAtomicTool):
                 self.model = "image-01"
             if not self.api_key:
                 self.api_key = config.minimax_api_key
+            # 默认请求URL：响应体不含base64膨胀（约小33%），图片可流式并发下载
+            self.minimax_response_format = os.getenv("MINIMAX_T2I_RESPONSE_FORMAT", "url").lower()
 
         self.timeout = getattr(config, "code_executor_timeout", 180)
+        # (连接超时, 读超时)：连接阶段快速失败以便重试尽快生效，读超时留给服务端生成
+        self._post_timeout = (self._CONNECT_TIMEOUT, self.timeout)
         self.output_dir = config.output_dir
         self.conv_manager = conv_manager
+        # 生成请求与图片下载共用连接池；计费接口，只在请求未被受理时重试。
+        # 鉴权头按请求传入，不放在会话上，避免随图片下载发往第三方存储
+        self._session = create_session(16, 16, paid_retry(total=2, methods=("GET", "POST")))
 
         logger.info(f"ImageGeneration 初始化: backend={self.backend}, model={self.model}")
 
+    @classmethod
+    def _write_base64(cls, data: str, file_path: Path) -> None:
+        """分块解码base64并写入文件，不生成整张图片大小的中间bytes对象"""
+        step = cls._B64_CHUNK_CHARS
+        with atomic_open(file_path) as f:
+            for i in range(0, len(data), step):
+                piece = data[i:i + step]
+                f.write(fast_base64.b64decode(piece + "=" * ((-len(piece)) & 3)))
+
+    def _download_image(self, url: str, file_path: Path) -> int:
+        """流式下载图像到文件，返回HTTP状态码（非200时不写文件）
+
+        响应体按256KiB分块直接写入缓冲文件，不在内存中保留整张图片；
+        下载完成后才以原子替换方式出现在目标路径，中途失败不留残缺文件。
+        """
+        with self._session.get(url, timeout=(self._CONNECT_TIMEOUT, 30), stream=True) as r:
+            if r.status_code != 200:
+                return r.status_code
+            r.raw.decode_content = True
+            with atomic_open(file_path) as f:
+                shutil.copyfileobj(r.raw, f, length=256 * 1024)
+        return 200
+
     def execute(self, **kwargs) -> Dict[str, Any]:
         """执行图像生成的核心逻辑"""
         # 提取通用参数
@@ -136,8 +197,7 @@ class ImageGeneration(BaseAtomicTool):
             raise RuntimeError("系统配置错误: 缺少conv_manager")
 
         output_dir_name = self.conv_manager.get_output_dir_name(conv_id)
-        work_dir = self.output_dir / output_dir_name
-        work_dir.mkdir(parents=True, exist_ok=True)
+        work_dir = ensure_dir(self.output_dir / output_dir_name)
 
         # 根据后端调用不同的生成方法
         if self.backend == "gemini":
@@ -181,11 +241,11 @@ class ImageGeneration(BaseAtomicTool):
 
         logger.info(f"调用 Gemini Image Generation API: model={self.model}, prompt={prompt[:50]}...")
 
-        response = requests.post(
+        response = self._session.post(
             self.api_url,
             headers=headers,
             json=payload,
-            timeout=self.timeout
+            timeout=self._post_timeout
         )
 
         if response.status_code != 200:
@@ -193,36 +253,48 @@ class ImageGeneration(BaseAtomicTool):
             logger.error(error_msg)
             raise RuntimeError(error_msg)
 
-        result = response.json()
+        # 响应体含大段base64图像数据，直接对原始字节做JSON解析（orjson可用时更快）
+        result = fast_json.loads(response.content)
 
         # 提取并保存图像（Gemini 返回格式）
         generated_files = []
         images_data = []
+        pending = []  # (文件名, base64数据)
 
-        if "candidates" in result:
-            for i, candidate in enumerate(result["candidates"]):
-                if "content" in candidate and "parts" in candidate["content"]:
-                    for j, part in enumerate(candidate["content"]["parts"]):
-                        if "inlineData" in part:
-                            # Base64 编码的图像
-                            mime_type = part["inlineData"].get("mimeType", "image/png")
-                            data = part["inlineData"].get("data", "")
-
-                            if data:
-                                ext = mime_type.split("/")[-1]
-                                filename = f"{filename_prefix}_{len(generated_files)+1}.{ext}"
-                                file_path = work_dir / filename
-
-                                # 解码并保存
-                                file_path.write_bytes(base64.b64decode(data))
-                                generated_files.append(filename)
-
-                                images_data.append({
-                                    "filename": filename,
-                                    "index": len(generated_files),
-                                    "mime_type": mime_type
-                                })
-                                logger.info(f"图像 {len(generated_files)} 保存成功: {filename}")
+        for candidate in result.get("candidates") or ():
+            for part in (candidate.get("content") or {}).get("parts") or ():
+                inline = part.get("inlineData")
+                if not inline:
+                    continue
+                # Base64 编码的图像
+                data = inline.get("data")
+                if not data:
+                    continue
+                mime_type = inline.get("mimeType", "image/png")
+                ext = mime_type.split("/")[-1]
+                filename = f"{filename_prefix}_{len(generated_files)+1}.{ext}"
+                pending.append((filename, data))
+                generated_files.append(filename)
+
+                images_data.append({
+                    "filename": filename,
+                    "index": len(generated_files),
+                    "mime_type": mime_type
+                })
+
+        # 分块解码并保存；多张图像时并发写盘，任一失败即抛出
+        if len(pending) == 1:
+            self._write_base64(pending[0][1], work_dir / pending[0][0])
+        elif pending:
+            with ThreadPoolExecutor(max_workers=min(len(pending), 4)) as pool:
+                futures = [
+                    pool.submit(self._write_base64, data, work_dir / filename)
+                    for filename, data in pending
+                ]
+                for future in futures:
+                    future.result()
+        for idx, (filename, _) in enumerate(pending):
+            logger.info(f"图像 {idx+1} 保存成功: {filename}")
 
         if not generated_files:
             raise RuntimeError("未能从Gemini响应中提取图像数据")
@@ -252,7 +324,7 @@ class ImageGeneration(BaseAtomicTool):
             "model": self.model,
             "prompt": prompt,
             "aspect_ratio": aspect_ratio,
-            "response_format": "url",
+            "response_format": self.minimax_response_format,
             "n": n,
             "prompt_optimizer": False
         }
@@ -264,19 +336,20 @@ class ImageGeneration(BaseAtomicTool):
 
         logger.info(f"调用 MiniMax Image Generation API: model={self.model}, aspect_ratio={aspect_ratio}, n={n}")
 
-        response = requests.post(
-            self.api_url,
-            headers=headers,
-            json=payload,
-            timeout=self.timeout
-        )
+        with self._MINIMAX_API_SEM:
+            response = self._session.post(
+                self.api_url,
+                headers=headers,
+                json=payload,
+                timeout=self._post_timeout
+            )
 
         if response.status_code != 200:
             error_msg = f"MiniMax API 错误: HTTP {response.status_code}, {response.text}"
             logger.error(error_msg)
             raise RuntimeError(error_msg)
 
-        result = response.json()
+        result = fast_json.loads(response.content)
 
         # 检查 base_resp
         base_resp = result.get("base_resp", {})
@@ -288,32 +361,46 @@ class ImageGeneration(BaseAtomicTool):
         generated_files = []
         images_data = []
 
-        if "data" in result and "image_urls" in result["data"]:
-            image_urls = result["data"]["image_urls"]
-
-            for idx, image_url in enumerate(image_urls):
-                try:
-                    # 下载图像
-                    img_response = requests.get(image_url, timeout=30)
-                    if img_response.status_code == 200:
-                        image_data = img_response.content
-
-                        filename = f"{filename_prefix}_{idx+1}.png"
-                        file_path = work_dir / filename
-                        file_path.write_bytes(image_data)
-                        generated_files.append(filename)
-
-                        images_data.append({
-                            "filename": filename,
-                            "index": idx + 1,
-                            "url": image_url
-                        })
-                        logger.info(f"图像 {idx+1} 保存成功: {filename}")
-                    else:
-                        logger.warning(f"下载图像 {idx+1} 失败: HTTP {img_response.status_code}")
-                except Exception as e:
-                    logger.warning(f"下载图像 {idx+1} 异常: {e}")
+        image_urls = (result.get("data") or {}).get("image_urls")
+        if image_urls:
+            # 并发下载图像（总耗时≈最慢的一张），按序号顺序汇总结果
+            filenames = [f"{filename_prefix}_{idx+1}.png" for idx in range(len(image_urls))]
+            with ThreadPoolExecutor(max_workers=max(1, min(len(image_urls), 4))) as pool:
+                futures = [
+                    pool.submit(self._download_image, url, work_dir / filename)
+                    for url, filename in zip(image_urls, filenames)
+                ]
+
+                for idx, (image_url, filename, future) in enumerate(zip(image_urls, filenames, futures)):
+                    try:
+                        status_code = future.result()
+                        if status_code == 200:
+                            generated_files.append(filename)
+
+                            images_data.append({
+                                "filename": filename,
+                                "index": idx + 1,
+                                "url": image_url
+                            })
+                            logger.info(f"图像 {idx+1} 保存成功: {filename}")
+                        else:
+                            logger.warning(f"下载图像 {idx+1} 失败: HTTP {status_code}")
+                    except Exception as e:
+                        logger.warning(f"下载图像 {idx+1} 异常: {e}")
+                        continue
+        else:
+            # 回退：后端不支持URL模式或配置为base64时，分块解码写入
+            for idx, data in enumerate((result.get("data") or {}).get("image_base64") or ()):
+                if not data:
                     continue
+                filename = f"{filename_prefix}_{idx+1}.png"
+                self._write_base64(data, work_dir / filename)
+                generated_files.append(filename)
+                images_data.append({
+                    "filename": filename,
+                    "index": idx + 1
+                })
+                logger.info(f"图像 {idx+1} 保存成功: {filename}")
 
         if not generated_files:
             raise RuntimeError("未能从MiniMax响应中提取图像数据")
@@ -63,6 +63,11 @@ detail级别选择：
                 "default": "auto",
                 "description": "图片细节级别（仅add操作生效）：low快速/high详细/auto平衡"
             },
+            "summary_only": {
+                "type": "boolean",
+                "default": False,
+                "description": "仅返回数量不返回图片明细（仅list操作生效）"
+            },
             "conversation_id": {
                 "type": "string",
                 "description": "对话ID（系统自动注入）"
@@ -88,6 +93,7 @@ detail级别选择：
         view_count: int = 1,
         detail: str = "auto",
         conversation_id: str = None,
+        summary_only: bool = False,
         **kwargs
     ) -> Dict[str, Any]:
         """执行图片列表管理操作
@@ -98,6 +104,7 @@ detail级别选择：
             view_count: 查看次数限制（默认1）
             detail: 细节级别
             conversation_id: 对话ID
+            summary_only: list操作仅返回数量
 
         Returns:
             执行结果
@@ -111,13 +118,15 @@ detail级别选择：
         # === list 操作：查看当前列表 ===
         if action == "list":
             images = self.conv_manager.get_images_to_view(conversation_id)
-            return {
+            result = {
                 "success": True,
                 "action": "list",
                 "count": len(images),
-                "images": images,
                 "message": f"当前查看列表中有 {len(images)} 张图片" if images else "查看列表为空"
             }
+            if not summary_only:
+                result["images"] = images
+            return result
 
         # === clear 操作：清空列表 ===
         if action == "clear":
@@ -137,9 +146,11 @@ detail级别选择：
                 "error": f"{action} 操作需要提供 image_paths 参数"
             }
 
-        # 获取输出目录
-        output_dir_name = self.conv_manager.get_output_dir_name(conversation_id)
-        conv_dir = Path("outputs") / output_dir_name
+        # 去重（保持原有顺序），避免重复校验和重复注入同一张图片
+        image_paths = list(dict.fromkeys(image_paths))
+
+        # 获取输出目录（目录名由基类按会话缓存）
+        conv_dir = Path("outputs") / self._get_output_dir_name(conversation_id)
 
         # === add 操作：添加图片 ===
         if action == "add":
@@ -207,8 +218,9 @@ detail级别选择：
             current_paths = {img["path"] for img in current_images}
 
             # 过滤出要移除的路径
-            to_remove = [p for p in image_paths if p in current_paths]
-            not_found = [p for p in image_paths if p not in current_paths]
+            to_remove, not_found = [], []
+            for p in image_paths:
+                (to_remove if p in current_paths else not_found).append(p)
 
             if not to_remove:
                 return {
@@ -217,25 +229,15 @@ detail级别选择：
                 }
 
             # 移除：保留不在to_remove中的图片
-            remaining = [img for img in current_images if img["path"] not in to_remove]
-
-            # 更新列表（先清空再添加）
-            self.conv_manager.clear_images_to_view(conversation_id)
-            if remaining:
-                # 按(detail, view_count)分组批量添加
-                from collections import defaultdict
-                groups = defaultdict(list)
-                for img in remaining:
-                    key = (img.get("detail", "auto"), img.get("remaining_views", 1))
-                    groups[key].append(img["path"])
-
-                for (detail_level, view_count), paths in groups.items():
-                    self.conv_manager.add_images_to_view(
-                        conversation_id,
-                        paths,
-                        detail_level,
-                        view_count
-                    )
+            to_remove_set = set(to_remove)
+            remaining = [img for img in current_images if img["path"] not in to_remove_set]
+
+            # 更新列表：按(detail, view_count)分组，一次性替换整个列表
+            groups: Dict[tuple, List[str]] = {}
+            for img in remaining:
+                key = (img.get("detail", "auto"), img.get("remaining_views", 1))
+                groups.setdefault(key, []).append(img["path"])
+            self.conv_manager.add_images_to_view_multi(conversation_id, groups, replace=True)
 
             result = {
                 "success": True,
@@ -10,9 +10,13 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+from functools import lru_cache
+import os
+import signal
 import subprocess
 import shlex
+import threading
 
 from src.tools.base import BaseAtomicTool, ToolStatus
 from src.utils.logger import get_logger
@@ -46,6 +50,7 @@ class MediaFFmpeg(BaseAtomicTool):
             "faststart": {"type": "boolean", "default": True, "description": "写入faststart优化"},
             "shortest": {"type": "boolean", "default": True, "description": "以较短轨道为准结束"},
             "reencode_video": {"type": "boolean", "default": False, "description": "即使不需要yuv420p也强制重编码视频"},
+            "fragmented": {"type": "boolean", "default": False, "description": "视频流复制时输出分片MP4(单遍写出、可边下边播，部分剪辑软件不兼容)"},
             "audio_codec": {"type": "string", "default": "aac", "description": "音频编码器(aac/copy)"},
             # mix 模式参数
             "vocal": {"type": "string", "description": "旁白音频文件(仅文件名)"},
@@ -63,11 +68,210 @@ class MediaFFmpeg(BaseAtomicTool):
         "required": ["mode", "conversation_id", "out"]
     }
 
+    # 固定参数模板（类级常量，避免每次调用重复构建）
+    _EVEN_VF = "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+    _YUV_VF = "scale=trunc(iw/2)*2:trunc(ih/2)*2,format=yuv420p"
+    _AAC_ARGS = ("-c:a", "aac", "-b:a", "128k")
+    _FASTSTART_ARGS = ("-movflags", "+faststart")
+    # 分片MP4（仅视频流复制且显式开启时使用）：单遍写出即可边下边播，省去faststart的整文件二次重写，
+    # 代价是个别老旧剪辑软件兼容性较差，因此默认关闭
+    _FRAG_MOVFLAGS_ARGS = ("-movflags", "+frag_keyframe+empty_moov+default_base_moof")
+    # 各模式的输入文件参数（mix模式的video可选）
+    _MODE_INPUTS = {
+        "mux": ("video", "audio"),
+        "transcode": ("video",),
+        "mix": ("vocal", "bgm", "video"),
+    }
+
+    # H.264编码器配置: 编码参数 / 追加在-vf末尾的像素格式滤镜 / 需放在输入之前的全局参数
+    # 画质参数按各编码器的恒定质量模式对齐libx264默认值(crf 23 / preset medium)
+    _VIDEO_ENCODERS = {
+        "libx264": {
+            "codec_args": ("-c:v", "libx264", "-profile:v", "high", "-level", "4.1",
+                           "-crf", "23", "-preset", "medium"),
+            "vf_suffix": "",
+            "global_args": (),
+        },
+        "h264_nvenc": {
+            "codec_args": ("-c:v", "h264_nvenc", "-profile:v", "high",
+                           "-preset", "p4", "-tune", "hq", "-rc", "vbr", "-cq", "23", "-b:v", "0"),
+            "vf_suffix": "",
+            "global_args": (),
+        },
+        "h264_qsv": {
+            "codec_args": ("-c:v", "h264_qsv", "-profile:v", "high",
+                           "-preset", "medium", "-global_quality", "23"),
+            "vf_suffix": ",format=nv12",
+            "global_args": (),
+        },
+        "h264_vaapi": {
+            "codec_args": ("-c:v", "h264_vaapi", "-profile:v", "high",
+                           "-rc_mode", "CQP", "-qp", "23"),
+            "vf_suffix": ",format=nv12,hwupload",
+            "global_args": ("-vaapi_device", "/dev/dri/renderD128"),
+        },
+    }
+    # 硬件编码器优先级（均不可用时回退libx264）
+    _HW_ENCODER_PREFERENCE = ("h264_nvenc", "h264_qsv", "h264_vaapi")
+    # 探测结果（首次需要重编码时才探测，进程内共享）
+    _ENCODER_LOCK = threading.Lock()
+    _detected_encoder: Optional[str] = None
+
+    # 仅输出错误信息，关闭逐帧进度，减少stderr输出量
+    _BASE_ARGS = ("ffmpeg", "-y", "-loglevel", "error", "-nostats")
+
+    # 并发控制：同时运行的ffmpeg进程数上限为CPU核数一半，每个进程分得相应的线程预算，
+    # 避免多轮对话并发编码时互相抢占CPU
+    _MAX_CONCURRENT_JOBS = max(1, (os.cpu_count() or 2) // 2)
+    _FFMPEG_SEM = threading.BoundedSemaphore(_MAX_CONCURRENT_JOBS)
+    _THREAD_ARGS = ("-threads", str(max(1, (os.cpu_count() or 4) // _MAX_CONCURRENT_JOBS)))
+
     def __init__(self, config):
         super().__init__(config)
         self.timeout = getattr(config, "code_executor_timeout", 180)
         self.output_dir = config.output_dir
 
+    @classmethod
+    def _video_encoder(cls, reencode: bool = True) -> str:
+        """返回本次调用使用的H.264编码器
+
+        纯流复制不需要编码器，直接返回libx264且不触发探测；首次重编码时探测一次，
+        探测期间并发的调用等待同一结果。
+        """
+        if not reencode:
+            return "libx264"
+        if cls._detected_encoder is None:
+            with cls._ENCODER_LOCK:
+                if cls._detected_encoder is None:
+                    cls._detected_encoder = cls._detect_h264_encoder()
+        return cls._detected_encoder
+
+    @staticmethod
+    def _detect_h264_encoder() -> str:
+        """探测可用的H.264硬件编码器，均不可用时回退libx264"""
+        cls = MediaFFmpeg
+        try:
+            listing = subprocess.run(
+                ["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True, timeout=5
+            ).stdout
+        except (OSError, subprocess.SubprocessError):
+            return "libx264"
+
+        for name in cls._HW_ENCODER_PREFERENCE:
+            if name not in listing:
+                continue
+            # 编译进ffmpeg不代表机器上有对应硬件，用1帧试编码确认
+            profile = cls._VIDEO_ENCODERS[name]
+            trial = [
+                "ffmpeg", "-hide_banner", "-loglevel", "error", *profile["global_args"],
+                "-f", "lavfi", "-i", "color=c=black:s=64x64", "-frames:v", "1",
+                "-vf", cls._YUV_VF + profile["vf_suffix"], *profile["codec_args"], "-f", "null", "-",
+            ]
+            try:
+                if subprocess.run(trial, capture_output=True, timeout=10).returncode == 0:
+                    logger.info(f"media_ffmpeg 使用硬件编码器: {name}")
+                    return name
+            except (OSError, subprocess.SubprocessError):
+                continue
+        return "libx264"
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _mux_args(
+        reencode: bool, faststart: bool, audio_codec: str, shortest: bool, encoder: str = "libx264",
+        fragmented: bool = False,
+    ) -> Tuple[str, ...]:
+        """音视频合成的编码参数（位于输入之后、输出文件名之前），按开关组合缓存"""
+        cls = MediaFFmpeg
+        if reencode:
+            profile = cls._VIDEO_ENCODERS[encoder]
+            args = ("-vf", cls._YUV_VF + profile["vf_suffix"]) + profile["codec_args"]
+            if faststart:
+                args += cls._FASTSTART_ARGS
+        else:
+            args = ("-c:v", "copy")
+            if fragmented:
+                args += cls._FRAG_MOVFLAGS_ARGS
+        args += cls._AAC_ARGS if audio_codec == "aac" else ("-c:a", "copy")
+        if shortest:
+            args += ("-shortest",)
+        return args + cls._THREAD_ARGS
+
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def _transcode_args(ensure_420: bool, faststart: bool, encoder: str = "libx264") -> Tuple[str, ...]:
+        """视频转码的编码参数，按开关组合缓存"""
+        cls = MediaFFmpeg
+        profile = cls._VIDEO_ENCODERS[encoder]
+        vf = (cls._YUV_VF if ensure_420 else cls._EVEN_VF) + profile["vf_suffix"]
+        args = ("-vf", vf) + profile["codec_args"]
+        if faststart:
+            args += cls._FASTSTART_ARGS
+        # 保持无音频或复制（不强制）
+        return args + ("-c:a", "copy") + cls._THREAD_ARGS
+
+    @staticmethod
+    def _sanitize_name(name: str) -> Optional[str]:
+        """校验纯文件名，合法返回原值，否则返回None
+
+        拒绝路径分隔符、'..'、控制字符，以及会被ffmpeg当作选项解析的'-'开头名称。
+        """
+        if (
+            name
+            and "/" not in name
+            and "\\" not in name
+            and ".." not in name
+            and not name.startswith("-")
+            and all(c >= " " for c in name)
+        ):
+            return name
+        return None
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def _probe_duration_cached(path: str, mtime_ns: int) -> float:
+        """ffprobe探测媒体时长（秒），按(路径, 修改时间)缓存，失败返回0"""
+        try:
+            r = subprocess.run(
+                ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+                 "-of", "default=nw=1:nk=1", path],
+                capture_output=True, text=True, timeout=10
+            )
+            return float(r.stdout.strip() or 0)
+        except (OSError, subprocess.SubprocessError, ValueError):
+            return 0.0
+
+    def _probe_duration(self, path: Path) -> float:
+        """获取媒体时长（秒），文件变化后自动重新探测"""
+        return self._probe_duration_cached(str(path), path.stat().st_mtime_ns)
+
+    def _run_ffmpeg(self, cmd: List[str], cwd: Path) -> None:
+        """执行ffmpeg命令，失败时抛出RuntimeError
+
+        子进程运行在独立进程组中，超时后整组强制结束，避免遗留孤儿进程。
+        进程数受类级信号量限制，超出上限的调用排队等待。
+        """
+        with self._FFMPEG_SEM:
+            p = subprocess.Popen(
+                cmd,
+                cwd=str(cwd),
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=1 << 20,
+                text=True,
+                start_new_session=True,
+            )
+            try:
+                out, err = p.communicate(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                try:
+                    os.killpg(p.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                p.communicate()
+                raise
+        if p.returncode != 0:
+            raise RuntimeError(err.strip() or out.strip())
 
     def execute(self, **kwargs) -> Dict[str, Any]:
         """执行工具逻辑
@@ -82,6 +286,7 @@ class MediaFFmpeg(BaseAtomicTool):
         faststart = bool(kwargs.get("faststart", True))
         shortest = bool(kwargs.get("shortest", True))
         reencode_video = bool(kwargs.get("reencode_video", False))
+        fragmented = bool(kwargs.get("fragmented", False))
         audio_codec = (kwargs.get("audio_codec") or "aac").lower()
 
         if not conv_id:
@@ -91,6 +296,14 @@ class MediaFFmpeg(BaseAtomicTool):
         if not out_name or not out_name.lower().endswith(".mp4"):
             raise RuntimeError("out必须以.mp4结尾")
 
+        # 一次性校验所有文件名参数（仅允许纯文件名）
+        bad_names = [
+            f"{k}={kwargs[k]!r}" for k in ("out", "video", "audio", "vocal", "bgm")
+            if kwargs.get(k) is not None and self._sanitize_name(kwargs[k]) is None
+        ]
+        if bad_names:
+            raise RuntimeError(f"文件名不合法(仅允许纯文件名): {', '.join(bad_names)}")
+
         # 规范化会话ID（避免传入 'outputs/<id>' 或路径）
         from pathlib import Path as _P
         conv_id = _P(str(conv_id)).name
@@ -98,7 +311,15 @@ class MediaFFmpeg(BaseAtomicTool):
         work_dir = self.output_dir / output_dir_name
         work_dir.mkdir(parents=True, exist_ok=True)
 
-        cmd: List[str] = ["ffmpeg", "-y"]
+        # 预先校验输入文件与输出目录，避免启动ffmpeg后才失败
+        inputs = [kwargs[k] for k in self._MODE_INPUTS.get(mode, ()) if kwargs.get(k)]
+        missing = [f for f in inputs if not (work_dir / f).is_file()]
+        if missing:
+            raise RuntimeError(f"输入文件不存在: {missing}")
+        if not os.access(work_dir, os.W_OK):
+            raise RuntimeError(f"输出目录不可写: {work_dir}")
+
+        cmd: List[str] = list(self._BASE_ARGS)
 
         if mode == "mux":
             video = kwargs.get("video")
@@ -106,42 +327,21 @@ class MediaFFmpeg(BaseAtomicTool):
             if not video or not audio:
                 raise RuntimeError("mux模式需要video与audio")
 
-            cmd += ["-i", video, "-i", audio]
-
-            # 视频编码策略
-            if ensure_420 or reencode_video:
-                vf = "scale=trunc(iw/2)*2:trunc(ih/2)*2,format=yuv420p"
-                cmd += ["-vf", vf, "-c:v", "libx264", "-profile:v", "high", "-level", "4.1"]
-                if faststart:
-                    cmd += ["-movflags", "+faststart"]
-            else:
-                cmd += ["-c:v", "copy"]
-
-            # 音频编码策略
-            if audio_codec == "aac":
-                cmd += ["-c:a", "aac", "-b:a", "128k"]
-            else:
-                cmd += ["-c:a", "copy"]
-
-            if shortest:
-                cmd += ["-shortest"]
-
-            cmd += [out_name]
+            reencode = ensure_420 or reencode_video
+            encoder = self._video_encoder(reencode)
+            cmd += [*self._VIDEO_ENCODERS[encoder]["global_args"], "-i", video, "-i", audio]
+            cmd.extend(self._mux_args(reencode, faststart, audio_codec, shortest, encoder, fragmented))
+            cmd.append(out_name)
 
         elif mode == "transcode":
             video = kwargs.get("video")
             if not video:
                 raise RuntimeError("transcode模式需要video")
 
-            cmd += ["-i", video]
-
-            vf = "scale=trunc(iw/2)*2:trunc(ih/2)*2,format=yuv420p" if ensure_420 else "scale=trunc(iw/2)*2:trunc(ih/2)*2"
-            cmd += ["-vf", vf, "-c:v", "libx264", "-profile:v", "high", "-level", "4.1"]
-            if faststart:
-                cmd += ["-movflags", "+faststart"]
-            # 保持无音频或复制（不强制）
-            cmd += ["-c:a", "copy"]
-            cmd += [out_name]
+            encoder = self._video_encoder()
+            cmd += [*self._VIDEO_ENCODERS[encoder]["global_args"], "-i", video]
+            cmd.extend(self._transcode_args(ensure_420, faststart, encoder))
+            cmd.append(out_name)
 
         elif mode == "mix":
             # 旁白+BGM混音，可输出音频；若同时传入 video 且 out 以 .mp4 结尾，则生成视频（两段式）
@@ -173,23 +373,26 @@ class MediaFFmpeg(BaseAtomicTool):
             fc_parts: List[str] = []
             # 输入映射: 0:vocal, 1:bgm
             # 背景音乐音量与淡入/淡出
-            bgm_chain = "[1:a]volume={:.2f}dB".format(bgm_gain_db)
+            bgm_filters = [f"[1:a]volume={bgm_gain_db:.2f}dB"]
             if fin > 0:
-                bgm_chain += ",afade=t=in:st=0:d={}".format(fin / 1000.0)
+                bgm_filters.append(f"afade=t=in:st=0:d={fin / 1000.0}")
             if fout > 0:
-                bgm_chain += ",afade=t=out:st=99999:d={}".format(fout / 1000.0)  # 过长，后续以shortest截断
-            bgm_chain += "[bgm0]"
-            fc_parts.append(bgm_chain)
+                # 淡出在旁白结束时完成：起点 = 旁白时长 - 淡出时长
+                vocal_dur = self._probe_duration(work_dir / vocal)
+                if vocal_dur > 0:
+                    st = max(0.0, vocal_dur - fout / 1000.0)
+                    bgm_filters.append(f"afade=t=out:st={st:.3f}:d={fout / 1000.0}")
+                else:
+                    logger.warning(f"media_ffmpeg 无法获取旁白时长，跳过BGM淡出: {vocal}")
+            fc_parts.append(",".join(bgm_filters) + "[bgm0]")
 
             if ducking:
                 # 侧链压缩: 以vocal作为sidechain，压低bgm
-                sc = (
-                    "[bgm0][0:a]sidechaincompress=threshold={thr}dB:ratio={ratio}:"
-                    "attack={att}:release={rel}:makeup=0:mix=1[ducked]"
-                ).format(thr=thr, ratio=ratio, att=att, rel=rel)
-                fc_parts.append(sc)
-                mix_input = "[ducked][0:a]amix=inputs=2:normalize=0:duration=longest[aout]"
-                fc_parts.append(mix_input)
+                fc_parts.append(
+                    f"[bgm0][0:a]sidechaincompress=threshold={thr}dB:ratio={ratio}:"
+                    f"attack={att}:release={rel}:makeup=0:mix=1[ducked]"
+                )
+                fc_parts.append("[ducked][0:a]amix=inputs=2:normalize=0:duration=longest[aout]")
             else:
                 # 直接混音
                 fc_parts.append("[bgm0][0:a]amix=inputs=2:normalize=0:duration=longest[aout]")
@@ -200,19 +403,18 @@ class MediaFFmpeg(BaseAtomicTool):
 
             # 输出音频编码
             if audio_out_name.lower().endswith(".m4a"):
-                cmd += ["-c:a", "aac", "-b:a", "128k"]
+                cmd.extend(self._AAC_ARGS)
             else:
                 # wav
                 cmd += ["-ar", "44100", "-ac", "2"]
             if shortest:
                 cmd += ["-shortest"]
+            cmd.extend(self._THREAD_ARGS)
 
             cmd += [audio_out_name]
 
             logger.info(f"media_ffmpeg 混音命令: {' '.join(shlex.quote(c) for c in cmd)} (cwd={work_dir})")
-            r = subprocess.run(cmd, cwd=str(work_dir), capture_output=True, text=True, timeout=self.timeout)
-            if r.returncode != 0:
-                raise RuntimeError(r.stderr.strip() or r.stdout.strip())
+            self._run_ffmpeg(cmd, work_dir)
 
             generated: List[str] = [audio_out_name]
 
@@ -220,25 +422,17 @@ class MediaFFmpeg(BaseAtomicTool):
             if is_video_out:
                 video = kwargs.get("video")
                 # 第二次调用 ffmpeg: 将 audio_out 与 video 合并，并确保兼容性
-                cmd2: List[str] = ["ffmpeg", "-y", "-i", video, "-i", audio_out_name]
-                if ensure_420 or reencode_video:
-                    vf = "scale=trunc(iw/2)*2:trunc(ih/2)*2,format=yuv420p"
-                    cmd2 += ["-vf", vf, "-c:v", "libx264", "-profile:v", "high", "-level", "4.1"]
-                    if faststart:
-                        cmd2 += ["-movflags", "+faststart"]
-                else:
-                    cmd2 += ["-c:v", "copy"]
-
+                reencode = ensure_420 or reencode_video
+                encoder = self._video_encoder(reencode)
+                cmd2: List[str] = [
+                    *self._BASE_ARGS, *self._VIDEO_ENCODERS[encoder]["global_args"], "-i", video, "-i", audio_out_name
+                ]
                 # aac 音频
-                cmd2 += ["-c:a", "aac", "-b:a", "128k"]
-                if shortest:
-                    cmd2 += ["-shortest"]
-                cmd2 += [out_name]
+                cmd2.extend(self._mux_args(reencode, faststart, "aac", shortest, encoder, fragmented))
+                cmd2.append(out_name)
 
                 logger.info(f"media_ffmpeg 合成视频命令: {' '.join(shlex.quote(c) for c in cmd2)} (cwd={work_dir})")
-                r2 = subprocess.run(cmd2, cwd=str(work_dir), capture_output=True, text=True, timeout=self.timeout)
-                if r2.returncode != 0:
-                    raise RuntimeError(r2.stderr.strip() or r2.stdout.strip())
+                self._run_ffmpeg(cmd2, work_dir)
                 generated.append(out_name)
 
             return {"mode": mode, "out": out_name, "generated_files": generated}
@@ -247,9 +441,7 @@ class MediaFFmpeg(BaseAtomicTool):
             raise RuntimeError(f"不支持的mode: {mode}")
 
         logger.info(f"media_ffmpeg 命令: {' '.join(shlex.quote(c) for c in cmd)} (cwd={work_dir})")
-        r = subprocess.run(cmd, cwd=str(work_dir), capture_output=True, text=True, timeout=self.timeout)
-        if r.returncode != 0:
-            raise RuntimeError(r.stderr.strip() or r.stdout.strip())
+        self._run_ffmpeg(cmd, work_dir)
 
         return {"mode": mode, "out": out_name, "generated_files": [out_name]}
 
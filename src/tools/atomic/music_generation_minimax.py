@@ -24,16 +24,31 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import os
+import re
 import requests
-import base64
+import binascii
+import hashlib
+import shutil
 
 from src.tools.base import BaseAtomicTool, ToolStatus
+from src.utils import fast_base64, fast_json, tts_cache
+from src.utils.dir_cache import ensure_dir
+from src.utils.http_session import create_session, paid_retry
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 可打印ASCII及常见空白字节，用于bytes.translate一次性判断数据是否为纯文本
+_TEXT_BYTES = bytes(range(32, 127)) + b"\t\n\r"
+
+# MP3帧同步字（MPEG-1/2 Layer III，有/无CRC）
+_MP3_SYNCS = frozenset((b'\xff\xfb', b'\xff\xfa', b'\xff\xf3', b'\xff\xf2'))
+
+# 响应体中data.audio字段的起始位置（匹配到值的左引号为止）
+_AUDIO_FIELD_RE = re.compile(rb'"audio"\s*:\s*"')
+
 
 class MusicGenerationMiniMax(BaseAtomicTool):
     name = "music_generation_minimax"
@@ -74,6 +89,174 @@ class MusicGenerationMiniMax(BaseAtomicTool):
         self.timeout = getattr(config, "code_executor_timeout", 180)
         self.output_dir = config.output_dir
         self.conv_manager = conv_manager
+        # 复用连接池；计费接口，只在请求未被受理时重试（读超时重试会重复计费且耗时翻倍）
+        self._session = create_session(8, 16, paid_retry(total=3, backoff_factor=1.0, methods=("GET", "POST")))
+        self._session.headers.update({
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "Connection": "keep-alive",
+        })
+        # 结果缓存目录：相同请求体直接复用已生成的音频，避免重复调用付费接口
+        self.cache_dir = Path(config.output_dir) / ".cache" / "minimax_music"
+
+    # 流式接收响应体的块大小
+    _READ_CHUNK_BYTES = 64 * 1024
+    # 判断编码类型所需的编码串长度
+    _SNIFF_CHARS = 4096
+
+    @classmethod
+    def _is_hex_encoded(cls, audio_encoded) -> bool:
+        """判断音频编码（str或bytes）是否为十六进制
+
+        用C实现的binascii.a2b_hex试解码首段，遇到非十六进制字符立即失败，
+        无需在Python层逐字符扫描整个编码串。base64数据首段全为十六进制字符的概率可忽略。
+        """
+        head = audio_encoded[:cls._SNIFF_CHARS]
+        try:
+            binascii.a2b_hex(head[:len(head) & ~1])
+            return True
+        except ValueError:
+            return False
+
+    @staticmethod
+    def _detect_audio_format(first_chunk: bytes) -> Optional[str]:
+        """根据解码后的首块数据判断音频格式
+
+        Returns:
+            "mp3" / "wav"，无法识别时返回None
+
+        Raises:
+            RuntimeError: 数据过短或实际为文本内容
+        """
+        # 验证音频文件格式（首块即覆盖全部数据时才可能不足10字节）
+        if len(first_chunk) < 10:
+            error_msg = f"音频数据太短（{len(first_chunk)}字节），可能不是有效的音频文件"
+            logger.error(error_msg)
+            raise RuntimeError(error_msg)
+
+        # 检查文件头，判断实际格式
+        header = first_chunk[:10]
+        # 延迟求值：日志级别过滤掉INFO时不做hex转换
+        logger.opt(lazy=True).info("音频文件头 (hex): {}", header.hex)
+
+        # MP3文件头: ID3 (0x494433) 或 MPEG sync (0xFFxx)
+        # WAV文件头: RIFF (0x52494646)
+        if header[:3] == b'ID3' or header[:2] in _MP3_SYNCS:
+            logger.info("✓ 检测到有效的MP3文件格式")
+            return "mp3"
+        if header[:4] == b'RIFF':
+            logger.warning("⚠️ 检测到WAV格式，但请求的是MP3格式")
+            return "wav"
+
+        # 尝试检查是否是文本：删除全部文本字节后为空即为纯文本
+        sample = first_chunk[:100]
+        if not sample.translate(None, _TEXT_BYTES):
+            text_sample = sample.decode('ascii')
+            logger.error(f"❌ 音频数据实际是文本内容: {text_sample}")
+            raise RuntimeError(f"API返回的不是音频文件，而是文本: {text_sample}")
+        logger.warning(f"⚠️ 无法识别的音频格式，文件头: {header.hex()}")
+        return None
+
+    def _receive_response(self, response, file_path: Path) -> Tuple[Dict[str, Any], Optional[int], Optional[str]]:
+        """接收响应体，内联编码音频在接收过程中逐块解码写入file_path
+
+        data.audio的编码串占响应体的绝大部分。这里在字节流中定位该字段，值一到达就按对齐长度
+        解码写盘，网络接收与解码交替进行；其余部分拼回后再做JSON解析（audio置为空串）。
+        未找到内联编码音频（如URL模式）时，返回完整解析结果，由调用方按常规逻辑处理。
+
+        Returns:
+            (解析后的响应, 写入的音频字节数, 实际格式)；未流式解码时后两项为None
+        """
+        chunks = response.iter_content(chunk_size=self._READ_CHUNK_BYTES)
+
+        # 1. 定位audio字段（只在新到达的数据附近重新搜索）
+        buf = bytearray()
+        match = None
+        for piece in chunks:
+            pos = max(0, len(buf) - 32)
+            buf += piece
+            match = _AUDIO_FIELD_RE.search(buf, pos)
+            if match:
+                break
+        if match is None:
+            return fast_json.loads(buf), None, None
+
+        prefix = bytes(buf[:match.end()])
+        rest = bytes(buf[match.end():])
+        del buf
+
+        # 2. 积累足够的字段值用于判断类型（或字段已结束）
+        while len(rest) < self._SNIFF_CHARS and b'"' not in rest:
+            piece = next(chunks, b"")
+            if not piece:
+                break
+            rest += piece
+        if rest.startswith(b"http"):
+            # URL模式：字段值很短，读完剩余部分按常规解析
+            return fast_json.loads(prefix + rest + b"".join(chunks)), None, None
+
+        is_hex = self._is_hex_encoded(rest.split(b'"', 1)[0])
+        align = 2 if is_hex else 4
+        decode = binascii.a2b_hex if is_hex else fast_base64.b64decode
+        logger.info(f"检测到{'十六进制' if is_hex else 'base64'}编码，边接收边解码写入")
+
+        # 3. 逐块解码写盘，直到字段值的右引号
+        carry = b""
+        audio_size = 0
+        actual_format = None
+        try:
+            with open(file_path, "wb", buffering=1 << 20) as f:
+                while True:
+                    end = rest.find(b'"')
+                    # 编码串中只可能出现"\/"一种转义
+                    data = (carry + (rest if end < 0 else rest[:end])).replace(b"\\/", b"/")
+                    if end < 0:
+                        # 未对齐的尾部（以及被块边界截断的转义符）留到下一块
+                        cut = len(data) - (1 if data.endswith(b"\\") else 0)
+                        cut -= cut % align
+                        data, carry = data[:cut], data[cut:]
+                    elif not is_hex:
+                        data += b"=" * ((-len(data)) & 3)
+
+                    if data:
+                        decoded = decode(data)
+                        if not audio_size:
+                            actual_format = self._detect_audio_format(decoded)
+                        f.write(decoded)
+                        audio_size += len(decoded)
+
+                    if end >= 0:
+                        rest = rest[end:]
+                        break
+                    rest = next(chunks, None)
+                    if rest is None:
+                        raise ValueError("响应体在音频数据中途结束")
+        except ValueError as decode_error:
+            file_path.unlink(missing_ok=True)
+            error_msg = f"音频解码失败: {decode_error}"
+            logger.error(error_msg)
+            raise RuntimeError(error_msg)
+        except Exception:
+            file_path.unlink(missing_ok=True)
+            raise
+
+        # 4. 其余部分拼回解析（prefix以左引号结尾，rest以右引号开头，audio即为空串）
+        result = fast_json.loads(prefix + rest + b"".join(chunks))
+        if not audio_size:
+            file_path.unlink(missing_ok=True)
+            return result, None, None
+        return result, audio_size, actual_format
+
+    def _download_audio(self, url: str, file_path: Path) -> int:
+        """流式下载音频到文件，返回写入的字节数"""
+        # 下载链接可能指向第三方存储，去掉会话级的鉴权头，避免泄露API Key
+        no_auth = {"Authorization": None, "Content-Type": None}
+        with self._session.get(url, headers=no_auth, stream=True, timeout=self.timeout) as r:
+            r.raise_for_status()
+            r.raw.decode_content = True
+            with open(file_path, "wb") as f:
+                shutil.copyfileobj(r.raw, f, length=1 << 20)
+        return file_path.stat().st_size
 
     def execute(self, **kwargs) -> Dict[str, Any]:
         """执行音乐生成的核心逻辑"""
@@ -108,9 +291,8 @@ class MusicGenerationMiniMax(BaseAtomicTool):
         if not self.conv_manager:
             raise RuntimeError("系统配置错误: 缺少conv_manager")
 
-        output_dir_name = self.conv_manager.get_output_dir_name(conv_id)
-        work_dir = self.output_dir / output_dir_name
-        work_dir.mkdir(parents=True, exist_ok=True)
+        output_dir_name = self._get_output_dir_name(conv_id)
+        work_dir = ensure_dir(self.output_dir / output_dir_name)
 
         # 构建请求体（严格按照官方文档格式）
         payload = {
@@ -124,114 +306,72 @@ class MusicGenerationMiniMax(BaseAtomicTool):
             }
         }
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        file_path = work_dir / filename
+
+        # 请求体只序列化一次，同时用作缓存键与POST数据（payload键顺序固定，序列化结果稳定）
+        body = fast_json.dumps(payload)
+
+        # 缓存命中：按请求体内容寻址，直接复制已有音频
+        cache_key = hashlib.blake2b(body, digest_size=16).hexdigest()
+        cached = self.cache_dir / f"{cache_key}.{fmt}"
+        if tts_cache.restore(cached, file_path):
+            logger.info(f"命中音乐缓存: {cached.name} -> {filename}")
+            return {
+                "model": model,
+                "prompt": prompt,
+                "has_lyrics": bool(lyrics),
+                "format": fmt,
+                "sample_rate": sample_rate,
+                "bitrate": bitrate,
+                "file_path": str(file_path),
+                "cache_hit": True,
+                "generated_files": [filename]
+            }
 
         logger.info(f"调用 MiniMax Music Generation API: model={model}, format={fmt}, lyrics_length={len(lyrics)}")
 
         try:
-            response = requests.post(
+            response = self._session.post(
                 self.api_url,
-                headers=headers,
-                json=payload,
-                timeout=self.timeout
+                data=body,
+                timeout=self.timeout,
+                stream=True
             )
 
-            if response.status_code != 200:
-                error_msg = f"MiniMax Music Generation API 错误: HTTP {response.status_code}, {response.text}"
-                logger.error(error_msg)
-                raise RuntimeError(error_msg)
+            with response:
+                if response.status_code != 200:
+                    error_msg = f"MiniMax Music Generation API 错误: HTTP {response.status_code}, {response.text}"
+                    logger.error(error_msg)
+                    raise RuntimeError(error_msg)
 
-            result = response.json()
+                # 边接收边解码：内联编码音频到达即写盘，不必等待完整响应体
+                result, streamed_size, actual_format = self._receive_response(response, file_path)
 
             # 检查 base_resp.status_code
             base_resp = result.get("base_resp", {})
             if base_resp.get("status_code") != 0:
+                if streamed_size is not None:
+                    file_path.unlink(missing_ok=True)
                 error_msg = base_resp.get("status_msg", "未知错误")
                 raise RuntimeError(f"MiniMax Music Generation 失败: {error_msg}")
 
             # 提取音频数据
             # MiniMax Music API 返回格式: {"base_resp": {...}, "data": {"audio": "hex_or_base64_string", ...}}
-            if "data" in result and "audio" in result["data"]:
-                audio_encoded = result["data"]["audio"]
-
-                # 调试信息：检查编码数据
-                logger.info(f"收到音频编码数据，长度: {len(audio_encoded)} 字符")
-                logger.info(f"数据前100字符: {audio_encoded[:100]}")
-
-                # 检测编码类型（十六进制 vs base64）
-                # 十六进制只包含 0-9, a-f, A-F
-                # Base64包含 A-Z, a-z, 0-9, +, /, =
-                is_hex = all(c in '0123456789abcdefABCDEF' for c in audio_encoded)
-
-                try:
-                    if is_hex:
-                        # 十六进制解码
-                        logger.info("检测到十六进制编码，使用hex解码")
-                        audio_bytes = bytes.fromhex(audio_encoded)
-                        logger.info(f"Hex解码成功，音频数据大小: {len(audio_bytes)} 字节")
-                    else:
-                        # Base64解码
-                        logger.info("检测到base64编码，使用base64解码")
-                        import base64
-                        # 修复base64 padding问题
-                        missing_padding = len(audio_encoded) % 4
-                        if missing_padding:
-                            audio_encoded += '=' * (4 - missing_padding)
-                            logger.info(f"已修复base64 padding，补充了 {4 - missing_padding} 个'='")
-                        audio_bytes = base64.b64decode(audio_encoded)
-                        logger.info(f"Base64解码成功，音频数据大小: {len(audio_bytes)} 字节")
-                except Exception as decode_error:
-                    error_msg = f"音频解码失败: {decode_error}. 数据前100字符: {audio_encoded[:100]}"
-                    logger.error(error_msg)
-                    raise RuntimeError(error_msg)
-
-                # 验证音频文件格式
-                if len(audio_bytes) < 10:
-                    error_msg = f"音频数据太短（{len(audio_bytes)}字节），可能不是有效的音频文件"
-                    logger.error(error_msg)
-                    raise RuntimeError(error_msg)
-
-                # 检查文件头，判断实际格式
-                header = audio_bytes[:10]
-                logger.info(f"音频文件头 (hex): {header.hex()}")
-
-                # MP3文件头: ID3 (0x494433) 或 MPEG sync (0xFFxx)
-                # WAV文件头: RIFF (0x52494646)
+            # URL模式下 data.audio（或 data.audio_url）为下载链接
+            data = result.get("data") or {}
+            audio_value = data.get("audio")
+            audio_url = data.get("audio_url")
+            if not audio_url and isinstance(audio_value, str) and audio_value.startswith(("http://", "https://")):
+                audio_url = audio_value
+
+            if streamed_size is not None:
+                logger.info(f"音频解码完成，音频数据大小: {streamed_size} 字节")
+            elif audio_url:
+                # 直接流式下载到文件，省去编码传输膨胀与本地解码
+                logger.opt(lazy=True).info("检测到音频下载链接，流式下载: {}", lambda: audio_url[:100])
+                audio_size = self._download_audio(audio_url, file_path)
+                logger.info(f"音频下载完成，音频数据大小: {audio_size} 字节")
                 actual_format = None
-                if header[:3] == b'ID3' or header[0:2] in [b'\xff\xfb', b'\xff\xfa', b'\xff\xf3', b'\xff\xf2']:
-                    actual_format = "mp3"
-                    logger.info("✓ 检测到有效的MP3文件格式")
-                elif header[:4] == b'RIFF':
-                    actual_format = "wav"
-                    logger.warning("⚠️ 检测到WAV格式，但请求的是MP3格式")
-                else:
-                    # 尝试检查是否是文本
-                    try:
-                        text_sample = audio_bytes[:100].decode('utf-8', errors='ignore')
-                        if all(32 <= ord(c) < 127 or c in '\n\r\t' for c in text_sample):
-                            logger.error(f"❌ 音频数据实际是文本内容: {text_sample[:200]}")
-                            raise RuntimeError(f"API返回的不是音频文件，而是文本: {text_sample[:100]}")
-                    except UnicodeDecodeError:
-                        pass
-                    logger.warning(f"⚠️ 无法识别的音频格式，文件头: {header.hex()}")
-
-                file_path = work_dir / filename
-                file_path.write_bytes(audio_bytes)
-                logger.info(f"音乐文件保存成功: {filename}（实际格式: {actual_format or '未知'}）")
-
-                return {
-                    "model": model,
-                    "prompt": prompt,
-                    "has_lyrics": bool(lyrics),
-                    "format": fmt,
-                    "sample_rate": sample_rate,
-                    "bitrate": bitrate,
-                    "file_path": str(file_path),
-                    "generated_files": [filename]
-                }
             else:
                 # 增加调试信息
                 logger.error(f"响应格式异常，result keys: {result.keys()}")
@@ -239,6 +379,24 @@ class MusicGenerationMiniMax(BaseAtomicTool):
                     logger.error(f"data keys: {result['data'].keys()}")
                 raise RuntimeError("响应中缺少音频数据")
 
+            logger.info(f"音乐文件保存成功: {filename}（实际格式: {actual_format or '未知'}）")
+
+            # 写入缓存：先写临时文件再原子替换，并发命中不会读到写了一半的文件；
+            # 超出容量上限时按最近使用时间淘汰（失败不影响主流程）
+            tts_cache.store(file_path, cached)
+
+            return {
+                "model": model,
+                "prompt": prompt,
+                "has_lyrics": bool(lyrics),
+                "format": fmt,
+                "sample_rate": sample_rate,
+                "bitrate": bitrate,
+                "file_path": str(file_path),
+                "cache_hit": False,
+                "generated_files": [filename]
+            }
+
         except requests.exceptions.RequestException as e:
             logger.error(f"music_generation_minimax 网络请求失败: {e}")
             raise RuntimeError(f"网络请求失败: {str(e)}")
@@ -3,14 +3,23 @@
 用于复杂多步骤任务的规划、跟踪和管理。
 """
 
+from collections import Counter
 from typing import Dict, Any, List
 from src.tools.base import BaseAtomicTool
 from src.tools.result import ToolResult
+from src.utils import fast_json
+from src.utils.dir_cache import ensure_dir
 from src.utils.logger import get_logger
-import json
+import os
 
 logger = get_logger(__name__)
 
+# 步骤必需字段（元组保持报错顺序，集合用于一次性求缺失字段）
+_REQUIRED_STEP_FIELDS = ("step", "action", "status")
+_REQUIRED_STEP_FIELD_SET = frozenset(_REQUIRED_STEP_FIELDS)
+_VALID_STATUSES = ("pending", "in_progress", "completed", "failed")
+_VALID_STATUS_SET = frozenset(_VALID_STATUSES)
+
 
 class PlanTool(BaseAtomicTool):
     """任务规划工具
@@ -74,6 +83,7 @@ class PlanTool(BaseAtomicTool):
         super().__init__(config)
         self.current_plan = None
         self.output_dir = config.output_dir
+        self._output_dir_str = os.fspath(config.output_dir)
 
     def execute(self, **kwargs) -> Dict[str, Any]:
         """执行任务规划
@@ -113,34 +123,37 @@ class PlanTool(BaseAtomicTool):
                 if not isinstance(step, dict):
                     raise ValueError(f"步骤{i+1}必须是字典类型")
 
-                required_fields = ["step", "action", "status"]
-                for field in required_fields:
-                    if field not in step:
-                        raise ValueError(f"步骤{i+1}缺少必需字段: {field}")
+                missing = _REQUIRED_STEP_FIELD_SET - step.keys()
+                if missing:
+                    fields = ", ".join(f for f in _REQUIRED_STEP_FIELDS if f in missing)
+                    raise ValueError(f"步骤{i+1}缺少必需字段: {fields}")
 
                 # 验证状态值
-                valid_statuses = ["pending", "in_progress", "completed", "failed"]
-                if step["status"] not in valid_statuses:
-                    raise ValueError(f"步骤{i+1}的状态必须是: {', '.join(valid_statuses)}")
+                status = step["status"]
+                if not isinstance(status, str) or status not in _VALID_STATUS_SET:
+                    raise ValueError(f"步骤{i+1}的状态必须是: {', '.join(_VALID_STATUSES)}")
 
             # 保存计划（内存）
+            counts = Counter(s["status"] for s in steps)
             self.current_plan = {
                 "task_description": task_description,
                 "steps": steps,
                 "total_steps": len(steps),
-                "completed_steps": len([s for s in steps if s["status"] == "completed"]),
-                "in_progress_steps": len([s for s in steps if s["status"] == "in_progress"]),
-                "pending_steps": len([s for s in steps if s["status"] == "pending"]),
-                "failed_steps": len([s for s in steps if s["status"] == "failed"])
+                "completed_steps": counts["completed"],
+                "in_progress_steps": counts["in_progress"],
+                "pending_steps": counts["pending"],
+                "failed_steps": counts["failed"]
             }
 
             # 持久化到文件
-            plan_dir = self.output_dir / output_dir_name
-            plan_dir.mkdir(parents=True, exist_ok=True)
-            plan_file = plan_dir / "plan.json"
+            # 路径按字符串拼接，目录创建由ensure_dir按路径缓存
+            plan_dir = os.path.join(self._output_dir_str, output_dir_name)
+            ensure_dir(plan_dir)
+            plan_file = os.path.join(plan_dir, "plan.json")
 
-            with open(plan_file, 'w', encoding='utf-8') as f:
-                json.dump(self.current_plan, f, ensure_ascii=False, indent=2)
+            # 先完整序列化为字节再一次写入（orjson直接产出UTF-8字节，无需再encode）
+            with open(plan_file, "wb") as f:
+                f.write(fast_json.dumps(self.current_plan, indent=True))
 
             logger.info(f"Plan已保存到: {plan_file}")
 
@@ -157,7 +170,7 @@ class PlanTool(BaseAtomicTool):
                     "summary": summary,
                     "plan": self.current_plan,
                     "saved_to": "plan.json",
-                    "plan_file_path": str(plan_file)
+                    "plan_file_path": plan_file
                 },
                 "generated_files": ["plan.json"]
             }
@@ -183,10 +196,13 @@ class PlanTool(BaseAtomicTool):
         ]
 
         # 按状态分组显示步骤
-        completed = [s for s in plan['steps'] if s['status'] == 'completed']
-        in_progress = [s for s in plan['steps'] if s['status'] == 'in_progress']
-        pending = [s for s in plan['steps'] if s['status'] == 'pending']
-        failed = [s for s in plan['steps'] if s['status'] == 'failed']
+        groups = {"completed": [], "in_progress": [], "pending": [], "failed": []}
+        for s in plan['steps']:
+            groups[s['status']].append(s)
+        completed = groups["completed"]
+        in_progress = groups["in_progress"]
+        pending = groups["pending"]
+        failed = groups["failed"]
 
         if completed:
             summary_lines.append("✅ 已完成:")
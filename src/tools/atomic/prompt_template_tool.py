@@ -43,6 +43,9 @@ class PromptTemplateRetriever(BaseAtomicTool):
         self.templates_dir = base_dir / "prompt_templates"
         self.index_file = self.templates_dir / "templates.json"
 
+        # 模板内容缓存（模板仅随部署变更，进程内缓存即可）
+        self._content_cache: Dict[str, str] = {}
+
         # 加载模板索引
         self.templates_data = self._load_index()
 
@@ -103,25 +106,27 @@ class PromptTemplateRetriever(BaseAtomicTool):
 
         template_info = templates[template_type]
 
-        # 读取模板文件内容
-        template_file = self.templates_dir / template_info["file_path"]
+        # 读取模板文件内容（命中缓存时跳过磁盘读取）
+        content = self._content_cache.get(template_type)
+        if content is None:
+            template_file = self.templates_dir / template_info["file_path"]
 
-        if not template_file.exists():
-            logger.error(f"模板文件不存在: {template_file}")
-            return {
-                "status": "error",
-                "error": f"模板文件不存在: {template_info['file_path']}"
-            }
+            if not template_file.exists():
+                logger.error(f"模板文件不存在: {template_file}")
+                return {
+                    "status": "error",
+                    "error": f"模板文件不存在: {template_info['file_path']}"
+                }
 
-        try:
-            with open(template_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except Exception as e:
-            logger.error(f"读取模板文件失败: {e}")
-            return {
-                "status": "error",
-                "error": f"读取模板文件失败: {str(e)}"
-            }
+            try:
+                content = template_file.read_text(encoding='utf-8')
+            except Exception as e:
+                logger.error(f"读取模板文件失败: {e}")
+                return {
+                    "status": "error",
+                    "error": f"读取模板文件失败: {str(e)}"
+                }
+            self._content_cache[template_type] = content
 
         logger.info(f"成功检索模板: {template_info['title']} ({len(content)} 字符)")
 
@@ -10,17 +10,65 @@
 - 返回 stdout/stderr/returncode，并给出“本次新增的文件列表”（会话目录差集）
 """
 
-from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import subprocess
 import os
 import re
+import tempfile
+import time
 
 from src.tools.base import BaseAtomicTool, ToolStatus
+from src.utils.dir_cache import ensure_dir
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 基础危险命令
+_BAD_PATTERNS = (
+    r"\bsudo\b",
+    r"\brm\b",
+    r"\bchmod\b",
+    r"\bchown\b",
+    r"\bmkfs\b",
+    r"\bmount\b",
+    r"\bumount\b",
+    r"\bshutdown\b|\breboot\b",
+    r"\bscp\b|\bssh\b",
+)
+
+# 包管理和环境修改命令
+_PACKAGE_MANAGEMENT_PATTERNS = (
+    r"\bpip\s+install\b",
+    r"\bpip3\s+install\b",
+    r"\bconda\s+install\b",
+    r"\bplaywright\s+install\b",
+    r"\bnpm\s+install\b",
+    r"\byarn\s+(add|install)\b",
+    r"\bapt-get\s+install\b",
+    r"\byum\s+install\b",
+    r"\bbrew\s+install\b",
+)
+
+_ALL_PATTERNS = _BAD_PATTERNS + _PACKAGE_MANAGEMENT_PATTERNS
+
+# 合并为单个预编译正则，一次扫描完成匹配；命名分组 p{i} 用于回查命中的模式
+# 模式均为小写ASCII，匹配前将命令统一转小写，避免IGNORECASE的逐字符大小写折叠
+_DANGER_RE = re.compile(
+    "|".join(f"(?P<p{i}>{p})" for i, p in enumerate(_ALL_PATTERNS))
+)
+_MV_PARENT_RE = re.compile(r"\bmv\b[^\n]*\.\./")
+
+# 快速预筛：上述每个模式都以完整单词开头（\b...\b），命令的\w+单词中不含这些关键词时
+# 必然不会命中，可跳过代价较高的多分支正则扫描。新增模式时需同步补充关键词
+_DANGER_KEYWORDS = frozenset((
+    "sudo", "rm", "chmod", "chown", "mkfs", "mount", "umount", "shutdown", "reboot", "scp", "ssh",
+    "pip", "pip3", "conda", "playwright", "npm", "yarn", "apt", "yum", "brew",
+))
+_WORD_RE = re.compile(r"\w+")
+
+# 单路输出(stdout/stderr)返回的最大字节数；完整输出由临时文件承接，不进内存
+_MAX_OUTPUT_BYTES = 1 << 20
+
 
 class ShellExecutor(BaseAtomicTool):
     """受限 Shell 执行工具"""
@@ -49,6 +97,7 @@ class ShellExecutor(BaseAtomicTool):
         super().__init__(config)
         self.timeout = config.code_executor_timeout
         self.output_dir = config.output_dir
+        self._output_dir_str = os.fspath(config.output_dir)
 
     def _is_dangerous(self, cmd: str) -> Optional[str]:
         """检查命令是否包含危险模式
@@ -56,49 +105,44 @@ class ShellExecutor(BaseAtomicTool):
         Returns:
             如果危险，返回匹配的模式；否则返回None
         """
-        # 基础危险命令
-        bad_patterns = [
-            r"\bsudo\b",
-            r"\brm\b",
-            r"\bchmod\b",
-            r"\bchown\b",
-            r"\bmkfs\b",
-            r"\bmount\b",
-            r"\bumount\b",
-            r"\bshutdown\b|\breboot\b",
-            r"\bscp\b|\bssh\b",
-        ]
-
-        # 包管理和环境修改命令（新增）
-        package_management_patterns = [
-            r"\bpip\s+install\b",
-            r"\bpip3\s+install\b",
-            r"\bconda\s+install\b",
-            r"\bplaywright\s+install\b",
-            r"\bnpm\s+install\b",
-            r"\byarn\s+(add|install)\b",
-            r"\bapt-get\s+install\b",
-            r"\byum\s+install\b",
-            r"\bbrew\s+install\b",
-        ]
-
-        # 合并所有模式
-        all_patterns = bad_patterns + package_management_patterns
-
-        for p in all_patterns:
-            if re.search(p, cmd, re.IGNORECASE):
-                return p
-
-        # 禁止向上级/绝对路径进行重定向或写入
-        forbid_paths = ["../", "/"]
-        if any(tok in cmd for tok in [">>", ">", "2>"]):
-            if any(fp in cmd for fp in forbid_paths):
-                return "redirect-outside-cwd"
+        cmd_lc = cmd.lower()
+        if not _DANGER_KEYWORDS.isdisjoint(_WORD_RE.findall(cmd_lc)):
+            m = _DANGER_RE.search(cmd_lc)
+            if m:
+                return _ALL_PATTERNS[int(m.lastgroup[1:])]
+
+        # 禁止向上级/绝对路径进行重定向或写入（'>' 覆盖 '>>' 与 '2>'，'/' 覆盖 '../'）
+        if ">" in cmd and "/" in cmd:
+            return "redirect-outside-cwd"
         # 禁止显式 mv 到上级
-        if re.search(r"\bmv\b[^\n]*\.\./", cmd):
+        if "../" in cmd and _MV_PARENT_RE.search(cmd):
             return "mv-parent"
         return None
 
+    @staticmethod
+    def _snapshot_files(work_dir: str) -> Dict[str, int]:
+        """列出目录下的文件及其修改时间(ns)
+
+        使用os.scandir，DirEntry的类型与stat信息来自目录读取结果，避免逐文件额外stat。
+        """
+        try:
+            with os.scandir(work_dir) as it:
+                return {e.name: e.stat().st_mtime_ns for e in it if e.is_file()}
+        except OSError:
+            return {}
+
+    @staticmethod
+    def _read_output(f) -> Tuple[str, bool]:
+        """读取子进程输出文件，最多_MAX_OUTPUT_BYTES字节
+
+        Returns:
+            (解码后的文本, 是否被截断)
+        """
+        truncated = os.fstat(f.fileno()).st_size > _MAX_OUTPUT_BYTES
+        f.seek(0)
+        data = f.read(_MAX_OUTPUT_BYTES)
+        return data.decode('utf-8', errors='replace'), truncated
+
     def execute(self, **kwargs) -> Dict[str, Any]:
         cmd: str = kwargs.get("cmd", "").strip()
         conversation_id: Optional[str] = kwargs.get("conversation_id")
@@ -116,60 +160,47 @@ class ShellExecutor(BaseAtomicTool):
         if danger:
             raise RuntimeError(f"命令包含受限模式: {danger}")
 
-        work_dir = self.output_dir / output_dir_name
-        work_dir.mkdir(parents=True, exist_ok=True)
+        # 路径按字符串拼接，目录创建由ensure_dir按路径缓存
+        work_dir = os.path.join(self._output_dir_str, output_dir_name)
+        ensure_dir(work_dir)
 
-        try:
-            pre_files = {p.name for p in work_dir.iterdir() if p.is_file()}
-        except Exception:
-            pre_files = set()
+        pre_files = self._snapshot_files(work_dir)
 
         logger.info(f"Shell执行: cwd={work_dir}, cmd={cmd}")
-        import time
         start_ns = time.time_ns()
-        try:
-            result = subprocess.run(
-                ["bash", "-lc", cmd],
-                cwd=str(work_dir),
-                capture_output=True,
-                text=False,  # 获取字节输出，避免UTF-8解码错误
-                timeout=timeout,
-                env={**os.environ}
-            )
-        except subprocess.TimeoutExpired:
-            raise RuntimeError(f"shell执行超时（限制{timeout}s）")
-
-        # 安全解码输出（容错非UTF-8字符）
-        try:
-            stdout = result.stdout.decode('utf-8', errors='replace')
-        except Exception as e:
-            logger.warning(f"stdout解码失败: {e}")
-            stdout = str(result.stdout)
-
-        try:
-            stderr = result.stderr.decode('utf-8', errors='replace')
-        except Exception as e:
-            logger.warning(f"stderr解码失败: {e}")
-            stderr = str(result.stderr)
+        # 子进程需要真实fd，SpooledTemporaryFile传入时也会立即落盘，直接用TemporaryFile
+        with tempfile.TemporaryFile() as out_f, tempfile.TemporaryFile() as err_f:
+            try:
+                result = subprocess.run(
+                    ["bash", "-lc", cmd],
+                    cwd=work_dir,
+                    stdout=out_f,
+                    stderr=err_f,
+                    timeout=timeout,
+                    env={**os.environ}
+                )
+            except subprocess.TimeoutExpired:
+                raise RuntimeError(f"shell执行超时（限制{timeout}s）")
+
+            # 按上限读回输出并安全解码（容错非UTF-8字符）
+            stdout, stdout_truncated = self._read_output(out_f)
+            stderr, stderr_truncated = self._read_output(err_f)
 
         returncode = result.returncode
 
-        try:
-            post_paths = [p for p in work_dir.iterdir() if p.is_file()]
-            post_files = {p.name for p in post_paths}
-        except Exception:
-            post_paths = []
-            post_files = set()
-        new_files_set = post_files - pre_files
-        try:
-            changed = [p.name for p in post_paths if getattr(p.stat(), 'st_mtime_ns', int(p.stat().st_mtime*1e9)) >= (start_ns - 5_000_000)]
-        except Exception:
-            changed = []
-        new_files = sorted(list({*new_files_set, *set(changed)}))
+        # 新增文件 + 本次执行期间被修改的文件
+        post_files = self._snapshot_files(work_dir)
+        threshold_ns = start_ns - 5_000_000
+        new_files = sorted(
+            name for name, mtime_ns in post_files.items()
+            if name not in pre_files or mtime_ns >= threshold_ns
+        )
 
         return {
             "stdout": stdout,
             "stderr": stderr,
+            "stdout_truncated": stdout_truncated,
+            "stderr_truncated": stderr_truncated,
             "returncode": returncode,
             "execution_time": f"<{timeout}s",
             "generated_files": new_files
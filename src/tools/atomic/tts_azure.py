@@ -23,14 +23,66 @@ from __future__ import annotations
 
 from pathlib import Path
 from typing import Dict, Any, Optional
+from functools import lru_cache
+from collections import deque
+import importlib
 import os
+import threading
 
 from src.tools.base import BaseAtomicTool, ToolStatus
+from src.utils import tts_cache
+from src.utils.dir_cache import ensure_dir
 from src.utils.logger import get_logger
+from src.utils.tts_chunking import CONCAT_FORMATS, split_text, write_concat_audio
 
 logger = get_logger(__name__)
 
 
+@lru_cache(maxsize=None)
+def _get_speechsdk():
+    """导入Azure Speech SDK（可选依赖），未安装时返回None
+
+    SDK体积较大，延迟到首次合成时导入，避免拖慢服务启动；导入结果进程内缓存。
+    """
+    try:
+        return importlib.import_module("azure.cognitiveservices.speech")
+    except ImportError:
+        return None
+
+
+# 输出格式 -> SpeechSynthesisOutputFormat成员名（SDK延迟导入，按名称解析）
+_OUTPUT_FORMATS = {
+    "mp3": "Audio24Khz48KBitRateMonoMp3",
+    "wav": "Riff24Khz16BitMonoPcm",
+}
+
+
+@lru_cache(maxsize=32)
+def _get_speech_config(key: str, region: str, fmt: str, voice_name: str):
+    """按(凭据, 格式, 音色)缓存SpeechConfig
+
+    SpeechConfig只在创建SpeechSynthesizer时被读取，缓存后不再修改，可在多次调用间共享。
+    """
+    speechsdk = _get_speechsdk()
+    speech_config = speechsdk.SpeechConfig(subscription=key, region=region)
+    speech_config.speech_synthesis_voice_name = voice_name
+
+    # 输出格式（非mp3一律按wav处理）
+    output_format = _OUTPUT_FORMATS.get(fmt, _OUTPUT_FORMATS["wav"])
+    speech_config.set_speech_synthesis_output_format(
+        getattr(speechsdk.SpeechSynthesisOutputFormat, output_format)
+    )
+    return speech_config
+
+
+# SSML骨架（rate用百分比，pitch用相对st近似；未使用mstts扩展，不声明其命名空间）
+_SSML_TEMPLATE = (
+    "<speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xml:lang='{lang}'>"
+    "<voice name='{voice}'><prosody rate='{rate}' pitch='{pitch}'>{text}</prosody></voice>"
+    "</speak>"
+)
+
+
 class TTSAzure(BaseAtomicTool):
     name = "tts_azure"
     description = (
@@ -50,10 +102,18 @@ class TTSAzure(BaseAtomicTool):
         "required": ["text", "conversation_id"]
     }
 
+    # 进程内同时进行的合成请求上限（共享同一订阅的并发配额）
+    _MAX_CONCURRENT_SYNTH = 5
+    _SYNTH_SEM = threading.BoundedSemaphore(_MAX_CONCURRENT_SYNTH)
+    # 单次调用内同时合成的分段数
+    _MAX_CHUNK_WINDOW = 4
+
     def __init__(self, config):
         super().__init__(config)
         self.timeout = getattr(config, "code_executor_timeout", 180)
         self.output_dir = config.output_dir
+        # 合成结果缓存目录：相同参数直接复用已合成的音频
+        self.cache_dir = Path(config.output_dir) / ".cache" / "tts_azure"
 
     def execute(self, **kwargs) -> Dict[str, Any]:
         """执行工具逻辑
@@ -77,8 +137,7 @@ class TTSAzure(BaseAtomicTool):
             raise RuntimeError("缺少_output_dir_name参数（应由master_agent自动注入）")
 
         # 规范化会话ID
-        from pathlib import Path as _P
-        conv_id = _P(str(conv_id)).name
+        conv_id = Path(str(conv_id)).name
 
         # 凭据
         key = os.getenv("AZURE_SPEECH_KEY") or os.getenv("SPEECH_KEY") or os.getenv("AZURE_TTS_KEY")
@@ -86,61 +145,114 @@ class TTSAzure(BaseAtomicTool):
         if not key or not region:
             raise RuntimeError("缺少AZURE_SPEECH_KEY/SPEECH_KEY或AZURE_SPEECH_REGION/SPEECH_REGION环境变量")
 
-        try:
-            import azure.cognitiveservices.speech as speechsdk  # type: ignore
-        except Exception as e:
-            raise RuntimeError(f"缺少依赖 azure-cognitiveservices-speech，请安装: {e}")
+        if _get_speechsdk() is None:
+            raise RuntimeError("缺少依赖 azure-cognitiveservices-speech，请安装: pip install azure-cognitiveservices-speech")
 
         # 输出文件与目录
-        work_dir = self.output_dir / output_dir_name
-        work_dir.mkdir(parents=True, exist_ok=True)
+        work_dir = ensure_dir(self.output_dir / output_dir_name)
         if not filename:
             filename = f"narration.{fmt}"
         out_path = work_dir / filename
 
-        # Speech Config
-        speech_config = speechsdk.SpeechConfig(subscription=key, region=region)
-        speech_config.speech_synthesis_voice_name = voice_name
-
-        # 输出格式
-        if fmt == "mp3":
-            speech_config.set_speech_synthesis_output_format(
-                speechsdk.SpeechSynthesisOutputFormat.Audio24Khz48KBitRateMonoMp3
-            )
-        else:  # wav
-            speech_config.set_speech_synthesis_output_format(
-                speechsdk.SpeechSynthesisOutputFormat.Riff24Khz16BitMonoPcm
-            )
+        # 缓存命中：按合成参数寻址，直接复制已有音频
+        cached = tts_cache.cache_path(self.cache_dir, out_path.suffix, voice_name, rate, pitch, fmt, text)
+        if tts_cache.restore(cached, out_path):
+            logger.info(f"命中TTS缓存: {cached.name} -> {out_path.name}")
+            return {"voice_name": voice_name, "format": fmt, "cache_hit": True, "generated_files": [out_path.name]}
 
-        audio_config = speechsdk.audio.AudioOutputConfig(filename=str(out_path))
-        synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
+        # Speech Config（含输出格式，进程内缓存）
+        speech_config = _get_speech_config(key, region, fmt, voice_name)
 
         # 构造SSML以支持rate/pitch
         # Azure pitch单位可用 st/Hz，此处用相对st近似；rate 用百分比
         rate_pct = int((rate - 1.0) * 100)
-        rate_attr = f"{rate_pct:+d}%"
-        pitch_attr = f"{int(pitch):+d}st"
-        ssml = f"""
-<speak version='1.0' xmlns='http://www.w3.org/2001/10/synthesis' xmlns:mstts='http://www.w3.org/2001/mstts' xml:lang='{voice_name.split('-')[0].lower()}'>
-  <voice name='{voice_name}'>
-    <prosody rate='{rate_attr}' pitch='{pitch_attr}'>
-      {self._escape(text)}
-    </prosody>
-  </voice>
-</speak>
-"""
+        ssml_fields = {
+            "lang": voice_name.split('-', 1)[0].lower(),
+            "voice": voice_name,
+            "rate": f"{rate_pct:+d}%",
+            "pitch": f"{int(pitch):+d}st",
+        }
+
+        chunks = split_text(text) if fmt in CONCAT_FORMATS else [text]
+        if len(chunks) == 1:
+            ssml_fields["text"] = self._escape(text)
+            ssml = _SSML_TEMPLATE.format_map(ssml_fields)
+            with self._SYNTH_SEM:
+                synthesizer, future = self._speak_async(speech_config, ssml, out_path)
+                self._check_result(future.get())
+        else:
+            # 长文本分段：滑动窗口内的分段同时合成到临时文件，完成后按序拼接
+            logger.info(f"长文本分{len(chunks)}段并发合成")
+            part_paths = [
+                out_path.with_name(f".{out_path.stem}.part{i}{out_path.suffix}") for i in range(len(chunks))
+            ]
+            pending = deque()
+            try:
+                for chunk, part_path in zip(chunks, part_paths):
+                    if len(pending) >= self._MAX_CHUNK_WINDOW:
+                        self._wait_pending(pending)
+                    ssml_fields["text"] = self._escape(chunk)
+                    ssml = _SSML_TEMPLATE.format_map(ssml_fields)
+                    self._SYNTH_SEM.acquire()
+                    try:
+                        pending.append(self._speak_async(speech_config, ssml, part_path))
+                    except Exception:
+                        self._SYNTH_SEM.release()
+                        raise
+                while pending:
+                    self._wait_pending(pending)
+                write_concat_audio(out_path, (p.read_bytes() for p in part_paths), fmt)
+            finally:
+                while pending:
+                    try:
+                        self._wait_pending(pending)
+                    except Exception:
+                        pass
+                for p in part_paths:
+                    p.unlink(missing_ok=True)
+
+        tts_cache.store(out_path, cached)
+        return {"voice_name": voice_name, "format": fmt, "cache_hit": False, "generated_files": [out_path.name]}
+
+    @staticmethod
+    def _speak_async(speech_config, ssml: str, out_path: Path):
+        """发起异步合成，音频直接写入out_path
+
+        合成在SDK内部线程进行，调用方可先发起多个请求再逐个get()。
+        返回的synthesizer需在get()完成前保持引用。
+
+        Returns:
+            (synthesizer, ResultFuture)
+        """
+        speechsdk = _get_speechsdk()
+        audio_config = speechsdk.audio.AudioOutputConfig(filename=str(out_path))
+        synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
+        return synthesizer, synthesizer.speak_ssml_async(ssml)
+
+    @classmethod
+    def _wait_pending(cls, pending: deque) -> None:
+        """等待最早发起的分段合成完成并释放并发名额"""
+        synthesizer, future = pending.popleft()
+        try:
+            cls._check_result(future.get())
+        finally:
+            cls._SYNTH_SEM.release()
 
-        result = synthesizer.speak_ssml(ssml)
-        from azure.cognitiveservices.speech import ResultReason  # type: ignore
-        if result.reason != ResultReason.SynthesizingAudioCompleted:
+    @staticmethod
+    def _check_result(result) -> None:
+        speechsdk = _get_speechsdk()
+        if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
             details = getattr(result, "cancellation_details", None)
             err = getattr(details, "error_details", None) if details else None
             raise RuntimeError(f"Azure TTS失败: {err or result.reason}")
 
-        return {"voice_name": voice_name, "format": fmt, "generated_files": [out_path.name]}
-
     @staticmethod
     def _escape(text: str) -> str:
+        """XML转义
+
+        保持str.replace链：无需转义的字符不存在时replace不复制字符串，
+        且对中文等非ASCII文本明显快于str.translate的逐字符字典查找。
+        """
         return (
             text.replace("&", "&amp;")
             .replace("<", "&lt;")
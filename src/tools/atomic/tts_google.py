@@ -19,17 +19,74 @@
 
 from __future__ import annotations
 
+from collections import OrderedDict
 from pathlib import Path
 from typing import Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import importlib
 import os
 import json
+import hashlib
+import threading
 
 from src.tools.base import BaseAtomicTool, ToolStatus
+from src.utils import tts_cache
+from src.utils.atomic_write import atomic_open
+from src.utils.dir_cache import ensure_dir
 from src.utils.logger import get_logger
+from src.utils.tts_chunking import CONCAT_FORMATS, split_text, write_concat_audio
 
 logger = get_logger(__name__)
 
 
+@lru_cache(maxsize=None)
+def _get_tts_modules():
+    """导入Google Cloud TTS相关模块（可选依赖），返回(texttospeech, service_account)，未安装时返回None
+
+    SDK（含gRPC/protobuf）导入较慢，延迟到首次合成时导入，避免拖慢服务启动；导入结果进程内缓存。
+    """
+    try:
+        return (
+            importlib.import_module("google.cloud.texttospeech"),
+            importlib.import_module("google.oauth2.service_account"),
+        )
+    except ImportError:
+        return None
+
+
+# 凭据指纹 -> TextToSpeechClient，按最近使用排序（只以指纹为键，凭据原文不留在缓存中）
+_CLIENTS: "OrderedDict[str, Any]" = OrderedDict()
+_CLIENTS_LOCK = threading.Lock()
+_MAX_CLIENTS = 4
+
+
+def _build_client(fingerprint: str, json_str: Optional[str]):
+    """按凭据指纹获取TextToSpeechClient（进程内复用，省去重复的私钥解析、鉴权与通道建立）
+
+    fingerprint为凭据内容摘要，凭据轮换后指纹变化会创建新客户端，旧客户端按LRU淘汰；
+    json_str仅在未命中时用于创建客户端，创建失败抛出的异常不会被缓存。
+    """
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(fingerprint)
+        if client is not None:
+            _CLIENTS.move_to_end(fingerprint)
+            return client
+
+        tts, service_account = _get_tts_modules()
+        if json_str:
+            creds = service_account.Credentials.from_service_account_info(json.loads(json_str))
+            client = tts.TextToSpeechClient(credentials=creds)
+        else:
+            # 回退到默认ADC(使用 GOOGLE_APPLICATION_CREDENTIALS)
+            client = tts.TextToSpeechClient()
+
+        _CLIENTS[fingerprint] = client
+        while len(_CLIENTS) > _MAX_CLIENTS:
+            _CLIENTS.popitem(last=False)
+        return client
+
+
 class TTSGoogle(BaseAtomicTool):
     name = "tts_google"
     description = (
@@ -51,10 +108,15 @@ class TTSGoogle(BaseAtomicTool):
         "required": ["text", "conversation_id"]
     }
 
+    # 分段并发合成的最大线程数
+    _MAX_CHUNK_WORKERS = 4
+
     def __init__(self, config):
         super().__init__(config)
         self.timeout = getattr(config, "code_executor_timeout", 180)
         self.output_dir = config.output_dir
+        # 合成结果缓存目录：相同参数直接复用已合成的音频
+        self.cache_dir = Path(config.output_dir) / ".cache" / "tts_google"
 
     def execute(self, **kwargs) -> Dict[str, Any]:
         """执行工具逻辑
@@ -78,26 +140,29 @@ class TTSGoogle(BaseAtomicTool):
         if not output_dir_name:
             raise RuntimeError("缺少_output_dir_name参数（应由master_agent自动注入）")
 
-        work_dir = self.output_dir / output_dir_name
-        work_dir.mkdir(parents=True, exist_ok=True)
+        work_dir = ensure_dir(self.output_dir / output_dir_name)
         if not filename:
             ext = ".mp3" if fmt == "mp3" else (".ogg" if fmt == "ogg_opus" else ".wav")
             filename = f"narration{ext}"
         out_path = work_dir / filename
 
+        modules = _get_tts_modules()
+        if modules is None:
+            raise RuntimeError("缺少依赖 google-cloud-texttospeech，请安装: pip install google-cloud-texttospeech")
+        tts = modules[0]
+
+        # 缓存命中：按合成参数寻址，直接复制已有音频
+        cached = tts_cache.cache_path(self.cache_dir, out_path.suffix, language_code, voice_name, speaking_rate, pitch, fmt, text)
+        if tts_cache.restore(cached, out_path):
+            logger.info(f"命中TTS缓存: {cached.name} -> {out_path.name}")
+            return {"language_code": language_code, "voice_name": voice_name, "format": fmt, "cache_hit": True, "generated_files": [out_path.name]}
+
         # 载入凭据
         client = self._create_client()
         if client is None:
             raise RuntimeError("未找到Google TTS凭据，请设置 GOOGLE_APPLICATION_CREDENTIALS 或 GCP_TTS_CREDENTIALS_JSON")
 
         # 组装请求
-        try:
-            from google.cloud import texttospeech as tts  # type: ignore
-        except Exception as e:
-            raise RuntimeError(f"缺少依赖 google-cloud-texttospeech，请安装: {e}")
-
-        synthesis_input = tts.SynthesisInput(text=text)
-
         # 声音
         if voice_name:
             voice = tts.VoiceSelectionParams(language_code=language_code, name=voice_name)
@@ -119,41 +184,49 @@ class TTSGoogle(BaseAtomicTool):
             pitch=pitch,
         )
 
-        response = client.synthesize_speech(input=synthesis_input, voice=voice, audio_config=audio_config)
-        content = response.audio_content
-        if not content:
-            raise RuntimeError("TTS返回空音频")
+        def synthesize(chunk: str) -> bytes:
+            response = client.synthesize_speech(
+                input=tts.SynthesisInput(text=chunk), voice=voice, audio_config=audio_config
+            )
+            if not response.audio_content:
+                raise RuntimeError("TTS返回空音频")
+            return response.audio_content
+
+        # 长文本按句子分段并发合成后拼接（OGG_OPUS不支持简单拼接，整段合成）
+        chunks = split_text(text) if fmt in CONCAT_FORMATS else [text]
+        if len(chunks) == 1:
+            # 单段：audio_content已是完整bytes，一次write即可
+            audio = synthesize(text)
+            with atomic_open(out_path) as f:
+                f.write(audio)
+        else:
+            logger.info(f"长文本分{len(chunks)}段并发合成")
+            with ThreadPoolExecutor(max_workers=min(len(chunks), self._MAX_CHUNK_WORKERS)) as pool:
+                # 按序逐段写入缓冲文件，不再拼出完整音频副本
+                write_concat_audio(out_path, pool.map(synthesize, chunks), fmt)
 
-        out_path.write_bytes(content)
-        return {"language_code": language_code, "voice_name": voice_name, "format": fmt, "generated_files": [out_path.name]}
+        tts_cache.store(out_path, cached)
+        return {"language_code": language_code, "voice_name": voice_name, "format": fmt, "cache_hit": False, "generated_files": [out_path.name]}
 
     def _create_client(self):
-        """根据环境变量创建Google TTS客户端。
+        """根据环境变量获取Google TTS客户端（按凭据指纹缓存）。
 
         优先使用 GCP_TTS_CREDENTIALS_JSON；否则走 GOOGLE_APPLICATION_CREDENTIALS。
         """
-        try:
-            from google.cloud import texttospeech as tts  # noqa: F401
-            from google.oauth2 import service_account  # type: ignore
-        except Exception:
+        if _get_tts_modules() is None:
             return None
 
         json_str = os.getenv("GCP_TTS_CREDENTIALS_JSON")
         if json_str:
-            try:
-                info = json.loads(json_str)
-                creds = service_account.Credentials.from_service_account_info(info)
-                from google.cloud import texttospeech as tts
-                return tts.TextToSpeechClient(credentials=creds)
-            except Exception as e:
-                logger.error(f"解析 GCP_TTS_CREDENTIALS_JSON 失败: {e}")
-                return None
+            fingerprint = "json:" + hashlib.blake2b(json_str.encode("utf-8"), digest_size=16).hexdigest()
+        else:
+            fingerprint = "adc:" + os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "")
 
-        # 回退到默认ADC(使用 GOOGLE_APPLICATION_CREDENTIALS)
         try:
-            from google.cloud import texttospeech as tts
-            return tts.TextToSpeechClient()
+            return _build_client(fingerprint, json_str)
         except Exception as e:
-            logger.error(f"创建默认GCP TTS客户端失败: {e}")
+            if json_str:
+                logger.error(f"解析 GCP_TTS_CREDENTIALS_JSON 失败: {e}")
+            else:
+                logger.error(f"创建默认GCP TTS客户端失败: {e}")
             return None
-
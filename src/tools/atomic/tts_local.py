@@ -1,9 +1,12 @@
 """本地TTS原子工具（离线优先）
 
-macOS: 调用系统 `say` 生成AIFF，再用ffmpeg转为WAV/M4A。
+macOS: 调用系统 `say` 直接生成AIFF/WAV/M4A。
 Linux/Windows: 尝试使用pyttsx3（若可用）；否则返回失败并提示使用ShellExecutor/ffmpeg。
 
 输出均写入会话目录 outputs/{conversation_id}/ 下，仅返回生成的文件名。
+
+并发: macOS下每次调用只启动一个单线程的say进程，多个会话的调用可直接并行；
+pyttsx3引擎非线程安全（sapi5/COM还绑定创建它的线程），引擎的创建与所有合成都在同一个专用线程上串行执行。
 """
 
 from __future__ import annotations
@@ -12,19 +15,30 @@ import os
 import platform
 import shlex
 import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 
 from src.tools.base import BaseAtomicTool, ToolStatus
+from src.utils.dir_cache import ensure_dir
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# pyttsx3支持（可选依赖，非macOS平台使用）
+try:
+    import pyttsx3  # type: ignore
+    PYTTSX3_SUPPORT = True
+except Exception:
+    pyttsx3 = None
+    PYTTSX3_SUPPORT = False
+
 
 class TTSLocal(BaseAtomicTool):
     name = "tts_local"
     description = (
-        "离线文本转语音。macOS使用系统'say'合成AIFF并可转换为WAV/M4A；"
+        "离线文本转语音。macOS使用系统'say'合成AIFF/WAV/M4A；"
         "其他平台尝试pyttsx3（若可用）。参数: text(必填), voice, rate, format(wav/m4a/aiff), filename"
     )
 
@@ -42,11 +56,88 @@ class TTSLocal(BaseAtomicTool):
         "required": ["text", "conversation_id"]
     }
 
+    # macOS say 输出参数：WAV为44.1kHz 16bit双声道PCM，M4A为128kbps AAC
+    _SAY_FORMAT_ARGS = {
+        "wav": ["--file-format=WAVE", "--data-format=LEI16@44100", "--channels=2"],
+        "m4a": ["--file-format=m4af", "--data-format=aac", "--bit-rate=128000"],
+    }
+
+    # 进程内共享的pyttsx3引擎（初始化需加载平台语音驱动，耗时较长，只初始化一次）。
+    # 引擎只在_ENGINE_EXECUTOR的唯一线程上创建和使用，单线程即保证串行
+    _ENGINE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyttsx3")
+    _engine = None
+    _engine_defaults: Dict[str, Any] = {}
+    # 引擎当前生效的voice/rate参数，变化时才重新设置
+    _engine_state: Dict[str, Any] = {}
+
     def __init__(self, config):
         super().__init__(config)
         self.timeout = max(30, int(getattr(config, "code_executor_timeout", 180)))
         self.output_dir = config.output_dir
 
+    # 子进程失败时保留的stderr末尾字节数
+    _STDERR_TAIL_BYTES = 4096
+
+    @classmethod
+    def _run_quiet(cls, cmd: List[str], cwd: str, timeout: int) -> Tuple[int, str]:
+        """运行子进程并返回(退出码, 错误信息)
+
+        stdout直接丢弃，stderr写入临时文件而非在内存中累积，仅在失败时读取末尾部分。
+        """
+        with tempfile.TemporaryFile() as err:
+            proc = subprocess.run(
+                cmd, cwd=cwd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=err, timeout=timeout
+            )
+            if proc.returncode == 0:
+                return 0, ""
+            size = err.seek(0, os.SEEK_END)
+            err.seek(max(0, size - cls._STDERR_TAIL_BYTES))
+            return proc.returncode, err.read().decode("utf-8", errors="replace").strip()
+
+    @classmethod
+    def _get_engine(cls):
+        """获取共享的pyttsx3引擎，首次调用时初始化（只能在_ENGINE_EXECUTOR线程上调用）"""
+        if cls._engine is None:
+            engine = pyttsx3.init()
+            cls._engine_defaults = {"voice": engine.getProperty("voice"), "rate": engine.getProperty("rate")}
+            cls._engine_state = {"voice": None, "rate": None}
+            cls._engine = engine
+        return cls._engine
+
+    @classmethod
+    def _pyttsx3_synthesize(cls, text: str, voice: Optional[str], rate: Optional[int], out: Path) -> None:
+        """用共享引擎合成到wav文件（在_ENGINE_EXECUTOR线程上执行）"""
+        engine = cls._get_engine()
+        state = cls._engine_state
+        if voice != state["voice"]:
+            voice_id = cls._engine_defaults["voice"]
+            if voice:
+                # 尝试匹配包含voice关键字的id/name
+                try:
+                    for v in engine.getProperty("voices"):
+                        if voice.lower() in (v.id or "").lower() or voice.lower() in (v.name or "").lower():
+                            voice_id = v.id
+                            break
+                except Exception:
+                    pass
+            try:
+                engine.setProperty("voice", voice_id)
+            except Exception:
+                pass
+            state["voice"] = voice
+        if rate != state["rate"]:
+            try:
+                engine.setProperty("rate", int(rate) if rate else cls._engine_defaults["rate"])
+            except Exception:
+                pass
+            state["rate"] = rate
+
+        try:
+            engine.save_to_file(text, str(out))
+            engine.runAndWait()
+        except Exception as e:
+            raise RuntimeError(f"pyttsx3合成失败: {e}")
+
     def execute(self, **kwargs) -> Dict[str, Any]:
         """执行工具逻辑
 
@@ -69,11 +160,9 @@ class TTSLocal(BaseAtomicTool):
             raise RuntimeError("缺少_output_dir_name参数（应由master_agent自动注入）")
 
         # 规范化会话ID（防止传入 'outputs/<id>' 或包含路径）
-        from pathlib import Path as _P
-        conv_id = _P(str(conv_id)).name
+        conv_id = Path(str(conv_id)).name
 
-        work_dir = self.output_dir / output_dir_name
-        work_dir.mkdir(parents=True, exist_ok=True)
+        work_dir = ensure_dir(self.output_dir / output_dir_name)
 
         sysname = platform.system().lower()
         gen_files: List[str] = []
@@ -83,88 +172,58 @@ class TTSLocal(BaseAtomicTool):
             filename = f"narration.{fmt}"
 
         if sysname == "darwin":
-            # macOS: say -> AIFF，再可转 wav/m4a
-            aiff_name = Path(filename).with_suffix(".aiff").name
-            aiff_path = work_dir / aiff_name
+            # macOS: say 直接按目标容器/编码输出（无需中间AIFF与ffmpeg转码）
+            if fmt in self._SAY_FORMAT_ARGS:
+                out_name = filename
+                format_args = self._SAY_FORMAT_ARGS[fmt]
+            else:
+                out_name = Path(filename).with_suffix(".aiff").name
+                format_args = []
             # 构造 say 命令
-            cmd = ["say"]
-            if voice:
-                cmd += ["-v", voice]
-            if rate:
-                cmd += ["-r", str(rate)]
-            cmd += ["-o", aiff_name, text]
-
-            logger.info(f"TTSLocal: say command: {' '.join(shlex.quote(c) for c in cmd)} (cwd={work_dir})")
-            r = subprocess.run(cmd, cwd=str(work_dir), capture_output=True, text=True, timeout=timeout)
-            if r.returncode != 0:
-                msg = (r.stderr or r.stdout or "").strip()
+            use_voice = bool(voice)
+
+            def build_say_cmd() -> List[str]:
+                cmd = ["say"]
+                if use_voice:
+                    cmd += ["-v", voice]
+                if rate:
+                    cmd += ["-r", str(rate)]
+                return cmd + format_args + ["-o", out_name, text]
+
+            cmd = build_say_cmd()
+            logger.opt(lazy=True).info(
+                "TTSLocal: say command: {} (cwd={})", lambda: shlex.join(cmd), lambda: work_dir
+            )
+            returncode, msg = self._run_quiet(cmd, str(work_dir), timeout)
+            if returncode != 0 and "Voice" in msg and "not found" in msg:
                 # 常见：指定 voice 不存在，自动降级为系统默认
-                if "Voice" in msg and "not found" in msg:
-                    logger.warning(f"TTSLocal: 指定voice不可用({voice})，自动降级为系统默认")
-                    cmd_fallback = ["say"]
-                    if rate:
-                        cmd_fallback += ["-r", str(rate)]
-                    cmd_fallback += ["-o", aiff_name, text]
-                    r2 = subprocess.run(cmd_fallback, cwd=str(work_dir), capture_output=True, text=True, timeout=timeout)
-                    if r2.returncode != 0:
-                        raise RuntimeError(f"say失败: {r2.stderr.strip() or r2.stdout.strip()}")
-                else:
-                    raise RuntimeError(f"say失败: {msg}")
-
-            gen_files.append(aiff_name)
-
-            # 需要转换格式
-            if fmt in ("wav", "m4a"):
-                out_path = work_dir / filename
-                if fmt == "wav":
-                    ffmpeg_cmd = [
-                        "ffmpeg", "-y", "-i", aiff_name,
-                        "-ar", "44100", "-ac", "2",
-                        out_path.name,
-                    ]
-                else:  # m4a (aac in mp4)
-                    ffmpeg_cmd = [
-                        "ffmpeg", "-y", "-i", aiff_name,
-                        "-c:a", "aac", "-b:a", "128k",
-                        out_path.name,
-                    ]
-                logger.info(f"TTSLocal: ffmpeg command: {' '.join(shlex.quote(c) for c in ffmpeg_cmd)}")
-                rr = subprocess.run(ffmpeg_cmd, cwd=str(work_dir), capture_output=True, text=True, timeout=timeout)
-                if rr.returncode != 0:
-                    raise RuntimeError(f"ffmpeg转码失败: {rr.stderr.strip() or rr.stdout.strip()}")
-                gen_files.append(out_path.name)
-
+                logger.warning(f"TTSLocal: 指定voice不可用({voice})，自动降级为系统默认")
+                use_voice = False
+                returncode, msg = self._run_quiet(build_say_cmd(), str(work_dir), timeout)
+            if returncode != 0 and format_args and "format" in msg.lower():
+                # 旧版say不支持直接输出该容器/编码：退回say原生AIFF输出
+                logger.warning(f"TTSLocal: say不支持直接输出{fmt}，改为输出AIFF: {msg}")
+                fmt = "aiff"
+                out_name = Path(filename).with_suffix(".aiff").name
+                format_args = []
+                returncode, msg = self._run_quiet(build_say_cmd(), str(work_dir), timeout)
+            if returncode != 0:
+                raise RuntimeError(f"say失败: {msg}")
+
+            gen_files.append(out_name)
             return {"voice": voice, "rate": rate, "format": fmt, "generated_files": gen_files}
 
         # 其他平台: 尝试pyttsx3
-        try:
-            import pyttsx3  # type: ignore
-        except Exception:
+        if not PYTTSX3_SUPPORT:
             raise RuntimeError("非macOS且未安装pyttsx3，无法离线TTS。可改用ShellExecutor+系统TTS，或启用云TTS。")
 
-        engine = pyttsx3.init()
-        if voice:
-            # 尝试匹配包含voice关键字的id/name
-            try:
-                for v in engine.getProperty("voices"):
-                    if voice.lower() in (v.id or "").lower() or voice.lower() in (v.name or "").lower():
-                        engine.setProperty("voice", v.id)
-                        break
-            except Exception:
-                pass
-        if rate:
-            try:
-                engine.setProperty("rate", int(rate))
-            except Exception:
-                pass
-
         # pyttsx3 保存到 wav
         out = work_dir / (Path(filename).with_suffix(".wav").name)
+        future = self._ENGINE_EXECUTOR.submit(self._pyttsx3_synthesize, text, voice, rate, out)
         try:
-            engine.save_to_file(text, str(out))
-            engine.runAndWait()
-        except Exception as e:
-            raise RuntimeError(f"pyttsx3合成失败: {e}")
+            future.result(timeout=timeout)
+        except FutureTimeoutError:
+            raise RuntimeError(f"pyttsx3合成超时（{timeout}秒）")
 
         gen_files.append(out.name)
         return {"voice": voice, "rate": rate, "format": "wav", "generated_files": gen_files}
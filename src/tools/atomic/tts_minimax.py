@@ -29,14 +29,26 @@ from __future__ import annotations
 from pathlib import Path
 from typing import Dict, Any, Optional
 import os
-import requests
+import binascii
 import time
 
 from src.tools.base import BaseAtomicTool, ToolStatus
+from src.utils import fast_base64, fast_json, tts_cache
+from src.utils.atomic_write import atomic_open
+from src.utils.dir_cache import ensure_dir
+from src.utils.http_session import create_session, paid_retry
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 可打印ASCII及常见空白字节，用于bytes.translate一次性判断数据是否为纯文本
+_TEXT_BYTES = bytes(range(32, 127)) + b"\t\n\r"
+
+# 音频文件头：MP3的ID3标签 / 帧同步字（MPEG-1/2 Layer III，有/无CRC），WAV的RIFF
+_ID3_MAGIC = b'ID3'
+_MP3_SYNCS = frozenset((b'\xff\xfb', b'\xff\xfa', b'\xff\xf3', b'\xff\xf2'))
+_WAV_MAGIC = b'RIFF'
+
 
 class TTSMiniMax(BaseAtomicTool):
     name = "tts_minimax"
@@ -84,7 +96,86 @@ class TTSMiniMax(BaseAtomicTool):
         self.timeout = getattr(config, "code_executor_timeout", 180)
         self.output_dir = config.output_dir
         self.conv_manager = conv_manager
+        # 合成结果缓存目录：相同参数直接复用已合成的音频，避免重复调用付费接口
+        self.cache_dir = Path(config.output_dir) / ".cache" / "tts_minimax"
+        # 复用keep-alive连接；计费接口，只在请求未被受理时重试
+        self._session = create_session(16, 32, paid_retry(total=3))
+
+    # 判断编码类型所需的编码串长度
+    _SNIFF_CHARS = 4096
+    # 每块解码的字符数：需同时是4的倍数（base64）和偶数（hex）
+    _DECODE_CHUNK_CHARS = 4 * 65536
+
+    @classmethod
+    def _is_hex_encoded(cls, audio_encoded: str) -> bool:
+        """判断音频编码串是否为十六进制
+
+        用C实现的binascii.a2b_hex试解码首段，遇到非十六进制字符立即失败，
+        无需在Python层逐字符扫描整个编码串。base64数据首段全为十六进制字符的概率可忽略。
+        """
+        head = audio_encoded[:cls._SNIFF_CHARS]
+        try:
+            binascii.a2b_hex(head[:len(head) & ~1])
+            return True
+        except ValueError:
+            return False
+
+    @classmethod
+    def _iter_decoded_chunks(cls, audio_encoded: str, is_hex: bool):
+        """按块解码音频编码串，逐块产出字节数据
+
+        base64 仅在末块补齐padding，中间块长度为4的倍数无需补齐。
+        """
+        step = cls._DECODE_CHUNK_CHARS
+        for i in range(0, len(audio_encoded), step):
+            piece = audio_encoded[i:i + step]
+            try:
+                if is_hex:
+                    # unhexlify直接走C实现，无需先跳过空白；binascii.Error是ValueError子类
+                    yield binascii.unhexlify(piece)
+                else:
+                    yield fast_base64.b64decode(piece + "=" * ((-len(piece)) & 3))
+            except ValueError as decode_error:
+                error_msg = f"音频解码失败: {decode_error}. 数据前100字符: {audio_encoded[:100]}"
+                logger.error(error_msg)
+                raise RuntimeError(error_msg)
+
+    @staticmethod
+    def _detect_audio_format(first_chunk: bytes) -> Optional[str]:
+        """根据首块解码数据校验并识别音频格式
+
+        Returns:
+            "mp3"/"wav"，无法识别时返回None
+
+        Raises:
+            RuntimeError: 数据过短或实际为文本内容
+        """
+        # 验证音频文件格式
+        if len(first_chunk) < 10:
+            error_msg = f"音频数据太短（{len(first_chunk)}字节），可能不是有效的音频文件"
+            logger.error(error_msg)
+            raise RuntimeError(error_msg)
 
+        # 检查文件头，判断实际格式
+        header = first_chunk[:10]
+        # 延迟求值：日志级别过滤掉INFO时不做hex转换
+        logger.opt(lazy=True).info("音频文件头 (hex): {}", header.hex)
+
+        if header.startswith(_ID3_MAGIC) or header[:2] in _MP3_SYNCS:
+            logger.info("✓ 检测到有效的MP3文件格式")
+            return "mp3"
+        if header.startswith(_WAV_MAGIC):
+            logger.warning("⚠️ 检测到WAV格式，但请求的是MP3格式")
+            return "wav"
+
+        # 尝试检查是否是文本：删除全部文本字节后为空即为纯文本
+        sample = first_chunk[:100]
+        if not sample.translate(None, _TEXT_BYTES):
+            text_sample = sample.decode('ascii')
+            logger.error(f"❌ 音频数据实际是文本内容: {text_sample}")
+            raise RuntimeError(f"API返回的不是音频文件，而是文本: {text_sample}")
+        logger.warning(f"⚠️ 无法识别的音频格式，文件头: {header.hex()}")
+        return None
 
     def execute(self, **kwargs) -> Dict[str, Any]:
         """执行工具逻辑
@@ -117,12 +208,30 @@ class TTSMiniMax(BaseAtomicTool):
             raise RuntimeError("系统配置错误: 缺少conv_manager")
 
         output_dir_name = self.conv_manager.get_output_dir_name(conv_id)
-        work_dir = self.output_dir / output_dir_name
-        work_dir.mkdir(parents=True, exist_ok=True)
+        work_dir = ensure_dir(self.output_dir / output_dir_name)
         if not filename:
             filename = f"narration.{fmt}"
         out_path = work_dir / filename
 
+        # 缓存命中：按合成参数寻址，直接复制已有音频
+        cached = tts_cache.cache_path(
+            self.cache_dir, out_path.suffix, model, voice_id, speed, vol, pitch, emotion, fmt, sample_rate, text
+        )
+        if tts_cache.restore(cached, out_path):
+            logger.info(f"命中TTS缓存: {cached.name} -> {out_path.name}")
+            return {
+                "model": model,
+                "voice_id": voice_id,
+                "speed": speed,
+                "vol": vol,
+                "pitch": pitch,
+                "emotion": emotion,
+                "format": fmt,
+                "file_path": str(out_path),
+                "cache_hit": True,
+                "generated_files": [out_path.name]
+            }
+
         # 构建 voice_setting
         voice_setting = {
             "voice_id": voice_id,
@@ -155,7 +264,7 @@ class TTSMiniMax(BaseAtomicTool):
 
         logger.info(f"调用 MiniMax TTS API: model={model}, voice_id={voice_id}, speed={speed}, emotion={emotion}")
 
-        response = requests.post(
+        response = self._session.post(
             self.api_url,
             headers=headers,
             json=payload,
@@ -167,7 +276,8 @@ class TTSMiniMax(BaseAtomicTool):
             logger.error(error_msg)
             raise RuntimeError(error_msg)
 
-        result = response.json()
+        # 响应携带整段编码音频，体积可达数MB：直接解析原始字节，省去解码为str的一步
+        result = fast_json.loads(response.content)
 
         # 检查 base_resp.status_code
         base_resp = result.get("base_resp", {})
@@ -182,67 +292,28 @@ class TTSMiniMax(BaseAtomicTool):
 
             # 调试信息：检查编码数据
             logger.info(f"收到音频编码数据，长度: {len(audio_encoded)} 字符")
-            logger.info(f"数据前100字符: {audio_encoded[:100]}")
+            logger.opt(lazy=True).info("数据前100字符: {}", lambda: audio_encoded[:100])
 
             # 检测编码类型（十六进制 vs base64）
             # 十六进制只包含 0-9, a-f, A-F
             # Base64包含 A-Z, a-z, 0-9, +, /, =
-            is_hex = all(c in '0123456789abcdefABCDEF' for c in audio_encoded)
-
-            try:
-                if is_hex:
-                    # 十六进制解码
-                    logger.info("检测到十六进制编码，使用hex解码")
-                    audio_bytes = bytes.fromhex(audio_encoded)
-                    logger.info(f"Hex解码成功，音频数据大小: {len(audio_bytes)} 字节")
-                else:
-                    # Base64解码
-                    logger.info("检测到base64编码，使用base64解码")
-                    import base64
-                    # 修复base64 padding问题
-                    missing_padding = len(audio_encoded) % 4
-                    if missing_padding:
-                        audio_encoded += '=' * (4 - missing_padding)
-                        logger.info(f"已修复base64 padding，补充了 {4 - missing_padding} 个'='")
-                    audio_bytes = base64.b64decode(audio_encoded)
-                    logger.info(f"Base64解码成功，音频数据大小: {len(audio_bytes)} 字节")
-            except Exception as decode_error:
-                error_msg = f"音频解码失败: {decode_error}. 数据前100字符: {audio_encoded[:100]}"
-                logger.error(error_msg)
-                raise RuntimeError(error_msg)
-
-            # 验证音频文件格式
-            if len(audio_bytes) < 10:
-                error_msg = f"音频数据太短（{len(audio_bytes)}字节），可能不是有效的音频文件"
-                logger.error(error_msg)
-                raise RuntimeError(error_msg)
-
-            # 检查文件头，判断实际格式
-            header = audio_bytes[:10]
-            logger.info(f"音频文件头 (hex): {header.hex()}")
+            is_hex = self._is_hex_encoded(audio_encoded)
+            logger.info(f"检测到{'十六进制' if is_hex else 'base64'}编码，分块解码写入")
 
-            # MP3文件头: ID3 (0x494433) 或 MPEG sync (0xFFxx)
-            # WAV文件头: RIFF (0x52494646)
+            # 分块解码并写入文件：不生成完整音频大小的bytes对象，首块用于校验文件头
+            if not audio_encoded:
+                raise RuntimeError("音频数据太短（0字节），可能不是有效的音频文件")
+            audio_size = 0
             actual_format = None
-            if header[:3] == b'ID3' or header[0:2] in [b'\xff\xfb', b'\xff\xfa', b'\xff\xf3', b'\xff\xf2']:
-                actual_format = "mp3"
-                logger.info("✓ 检测到有效的MP3文件格式")
-            elif header[:4] == b'RIFF':
-                actual_format = "wav"
-                logger.warning("⚠️ 检测到WAV格式，但请求的是MP3格式")
-            else:
-                # 尝试检查是否是文本
-                try:
-                    text_sample = audio_bytes[:100].decode('utf-8', errors='ignore')
-                    if all(32 <= ord(c) < 127 or c in '\n\r\t' for c in text_sample):
-                        logger.error(f"❌ 音频数据实际是文本内容: {text_sample[:200]}")
-                        raise RuntimeError(f"API返回的不是音频文件，而是文本: {text_sample[:100]}")
-                except:
-                    pass
-                logger.warning(f"⚠️ 无法识别的音频格式，文件头: {header.hex()}")
-
-            out_path.write_bytes(audio_bytes)
+            with atomic_open(out_path) as f:
+                for audio_chunk in self._iter_decoded_chunks(audio_encoded, is_hex):
+                    if not audio_size:
+                        actual_format = self._detect_audio_format(audio_chunk)
+                    f.write(audio_chunk)
+                    audio_size += len(audio_chunk)
+            logger.info(f"解码成功，音频数据大小: {audio_size} 字节")
             logger.info(f"音频保存成功: {filename}（实际格式: {actual_format or '未知'}）")
+            tts_cache.store(out_path, cached)
 
             return {
                     "model": model,
@@ -252,7 +323,8 @@ class TTSMiniMax(BaseAtomicTool):
                     "pitch": pitch,
                     "emotion": emotion,
                     "format": fmt,
-                    "file_path": str(out_path)
+                    "file_path": str(out_path),
+                    "cache_hit": False
                 , "generated_files": [out_path.name]}
         else:
             raise RuntimeError("响应中缺少音频数据")
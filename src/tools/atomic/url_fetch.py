@@ -1,15 +1,29 @@
 """URL内容抓取工具
 
 支持Jina Reader和Firecrawl两个服务，Jina为主（免费），Firecrawl为备用。
+抓取结果按URL缓存到磁盘，有效期内重复抓取直接返回缓存内容。
 """
 
-import requests
-from typing import Dict, Any
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Optional
 from src.tools.base import BaseAtomicTool
+from src.utils import fast_json
+from src.utils.atomic_write import atomic_open
+from src.utils.dir_cache import ensure_dir
+from src.utils.http_session import create_session, idempotent_retry
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Markdown一级标题行（只在正文开头的有限窗口内查找）
+_TITLE_RE = re.compile(r"^[ \t]*# (.*?)\s*$", re.MULTILINE)
+_TITLE_SEARCH_CHARS = 16384
+
 
 class URLFetchTool(BaseAtomicTool):
     """URL内容抓取工具
@@ -26,6 +40,11 @@ class URLFetchTool(BaseAtomicTool):
             "url": {
                 "type": "string",
                 "description": "要抓取的网页URL"
+            },
+            "force_refresh": {
+                "type": "boolean",
+                "description": "是否忽略缓存重新抓取(页面内容已更新时使用)",
+                "default": False
             }
         },
         "required": ["url"]
@@ -35,16 +54,71 @@ class URLFetchTool(BaseAtomicTool):
         super().__init__(config)
         self.firecrawl_key = config.firecrawl_api_key
         self.timeout = 60  # URL抓取超时时间
-
-    def execute(self, url: str) -> Dict[str, Any]:
+        # 抓取结果缓存：文件修改时间即抓取时间，超过有效期视为过期
+        self.cache_ttl = getattr(config, "url_fetch_cache_ttl", 86400)
+        self._cache_dir = Path(config.output_dir) / ".cache" / "url_fetch"
+        # Jina/Firecrawl请求共用连接池，抓取请求幂等，限流与网关类错误自动退避重试。
+        # 读超时不重试：单次超时已达60秒，应尽快回退到Firecrawl
+        self._session = create_session(
+            32, 32, idempotent_retry(total=2, methods=("GET", "POST"), retry_reads=False)
+        )
+
+    # 批量抓取的最大并发数
+    _MAX_PARALLEL_FETCHES = 8
+
+    def execute(self, url: str, force_refresh: bool = False) -> Dict[str, Any]:
         """抓取URL内容
 
         Args:
             url: 目标URL
+            force_refresh: 是否忽略缓存重新抓取
 
         Returns:
             抓取结果字典
         """
+        url = url.strip()
+        cache_file = self._cache_dir / f"{hashlib.blake2b(url.encode('utf-8'), digest_size=16).hexdigest()}.json"
+
+        if not force_refresh:
+            cached = self._load_cache(cache_file)
+            if cached is not None:
+                logger.info(f"命中URL抓取缓存: {url}")
+                cached["cache_hit"] = True
+                return cached
+
+        result = self._fetch(url)
+        self._save_cache(cache_file, result)
+        result["cache_hit"] = False
+        return result
+
+    def _load_cache(self, cache_file: Path) -> Optional[Dict[str, Any]]:
+        """读取未过期的缓存结果，不存在、已过期或损坏时返回None"""
+        if self.cache_ttl <= 0:
+            return None
+        try:
+            if time.time() - os.stat(cache_file).st_mtime >= self.cache_ttl:
+                return None
+            with open(cache_file, "rb") as f:
+                return fast_json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"读取URL抓取缓存失败: {cache_file.name}, error={e}")
+            return None
+
+    def _save_cache(self, cache_file: Path, result: Dict[str, Any]) -> None:
+        """写入缓存（先写临时文件再原子替换，并发抓取同一URL不会读到半截文件；失败不影响主流程）"""
+        if self.cache_ttl <= 0:
+            return
+        try:
+            ensure_dir(self._cache_dir)
+            with atomic_open(cache_file) as f:
+                f.write(fast_json.dumps(result))
+        except Exception as e:
+            logger.warning(f"写入URL抓取缓存失败: {e}")
+
+    def _fetch(self, url: str) -> Dict[str, Any]:
+        """依次尝试Jina Reader与Firecrawl抓取URL"""
         # 优先使用Jina Reader（免费）
         try:
             logger.info(f"使用Jina Reader抓取: {url}")
@@ -80,18 +154,14 @@ class URLFetchTool(BaseAtomicTool):
             "X-Timeout": str(self.timeout)
         }
 
-        response = requests.get(jina_url, headers=headers, timeout=self.timeout)
+        response = self._session.get(jina_url, headers=headers, timeout=self.timeout)
         response.raise_for_status()
 
         content = response.text
 
-        # 提取标题（从Markdown的第一个#标题）
-        title = ""
-        lines = content.split("\n")
-        for line in lines:
-            if line.strip().startswith("# "):
-                title = line.strip()[2:]
-                break
+        # 提取标题（从Markdown的第一个#标题），只扫描开头部分，不切分整篇内容
+        m = _TITLE_RE.search(content, 0, _TITLE_SEARCH_CHARS)
+        title = m.group(1) if m else ""
 
         return {
             "url": url,
@@ -123,7 +193,7 @@ class URLFetchTool(BaseAtomicTool):
             "formats": ["markdown"]
         }
 
-        response = requests.post(api_url, headers=headers, json=payload, timeout=self.timeout)
+        response = self._session.post(api_url, headers=headers, json=payload, timeout=self.timeout)
         response.raise_for_status()
         data = response.json()
 
@@ -144,19 +214,28 @@ class URLFetchTool(BaseAtomicTool):
             urls: URL列表
 
         Returns:
-            抓取结果列表
+            抓取结果列表（与urls顺序一致）
         """
-        results = []
-        for url in urls:
-            try:
-                result = self.execute(url)
-                results.append(result)
-            except Exception as e:
-                logger.error(f"抓取URL失败: {url}, error={str(e)}")
-                results.append({
-                    "url": url,
-                    "error": str(e),
-                    "status": "failed"
-                })
-
+        if not urls:
+            return []
+
+        # 重复URL只抓取一次（保持首次出现顺序）
+        unique_urls = list(dict.fromkeys(urls))
+
+        # 并发抓取（总耗时≈最慢的一批），再按输入顺序汇总结果
+        results_by_url: Dict[str, Dict[str, Any]] = {}
+        with ThreadPoolExecutor(max_workers=min(len(unique_urls), self._MAX_PARALLEL_FETCHES)) as pool:
+            futures = [pool.submit(self.execute, url) for url in unique_urls]
+            for url, future in zip(unique_urls, futures):
+                try:
+                    results_by_url[url] = future.result()
+                except Exception as e:
+                    logger.error(f"抓取URL失败: {url}, error={str(e)}")
+                    results_by_url[url] = {
+                        "url": url,
+                        "error": str(e),
+                        "status": "failed"
+                    }
+
+        results = [results_by_url[url] for url in urls]
         return results
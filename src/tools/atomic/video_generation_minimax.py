@@ -17,6 +17,11 @@
   - duration(int): 视频时长(秒), 默认: 6
   - resolution(str): 分辨率 (720P, 1080P), 默认: 1080P
   - filename(str): 输出文件名
+
+连接:
+  提交、状态轮询与视频下载共用实例内的requests.Session。任务提交与轮询同在API主机上，
+  整个轮询过程复用同一条keep-alive连接（HTTP/1.1逐个请求，轮询间隔远大于RTT，无队头阻塞问题）；
+  视频下载走CDN主机，单独建连且不携带Authorization头。
 """
 
 from __future__ import annotations
@@ -24,10 +29,16 @@ from __future__ import annotations
 from pathlib import Path
 from typing import Dict, Any, Optional
 import os
-import requests
+import random
+import shutil
 import time
 
 from src.tools.base import BaseAtomicTool, ToolStatus
+from src.utils import fast_json
+from src.utils.atomic_write import atomic_open
+from src.utils.dir_cache import ensure_dir
+from src.utils.http_retry import post_with_retry
+from src.utils.http_session import create_session
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -68,12 +79,35 @@ class VideoGenerationMiniMax(BaseAtomicTool):
         super().__init__(config)
         self.api_key = config.minimax_api_key
         self.api_url = config.minimax_video_api_url
+        # 查询端点通常是 /query 或 /task/{task_id}
+        self.query_url = f"{self.api_url.replace('/video_generation', '')}/query"
+        # 请求头每个实例只构建一次，提交与每次轮询复用
+        self._json_headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
         # 视频生成通常需要更长时间
         self.timeout = int(os.getenv("MINIMAX_VIDEO_TIMEOUT", "300"))
         self.poll_interval = int(os.getenv("MINIMAX_VIDEO_POLL_INTERVAL", "5"))
         self.max_poll_attempts = int(os.getenv("MINIMAX_VIDEO_MAX_POLL_ATTEMPTS", "120"))
+        # 轮询总等待时长上限（与固定间隔轮询时的总时长一致，默认10分钟）
+        self.poll_timeout = self.poll_interval * self.max_poll_attempts
         self.output_dir = config.output_dir
         self.conv_manager = conv_manager
+        # 提交/轮询/下载共用连接池。适配器层不重试：提交POST由post_with_retry重试，
+        # 轮询失败由轮询循环在下一轮重试，叠加重试会放大建连次数并超出poll_timeout
+        self._session = create_session(4, 32)
+
+    # 轮询退避：首次约1秒后查询，之后每次间隔×1.25，最长10秒，并加随机抖动错开并发任务
+    _POLL_FIRST_DELAY = 1.0
+    _POLL_BACKOFF = 1.25
+    _POLL_MAX_DELAY = 10.0
+    _POLL_JITTER = 0.2
+
+    # 任务状态取值（接口大小写不统一）
+    _STATUS_DONE = frozenset({"completed", "Success", "succeeded"})
+    _STATUS_FAILED = frozenset({"failed", "Failed"})
+    _STATUS_PENDING = frozenset({"pending", "processing", "Processing", "Pending"})
 
     def execute(self, **kwargs) -> Dict[str, Any]:
         """执行视频生成的核心逻辑"""
@@ -97,9 +131,8 @@ class VideoGenerationMiniMax(BaseAtomicTool):
         if not self.conv_manager:
             raise RuntimeError("系统配置错误: 缺少conv_manager")
 
-        output_dir_name = self.conv_manager.get_output_dir_name(conv_id)
-        work_dir = self.output_dir / output_dir_name
-        work_dir.mkdir(parents=True, exist_ok=True)
+        output_dir_name = self._get_output_dir_name(conv_id)
+        work_dir = ensure_dir(self.output_dir / output_dir_name)
 
         # 构建请求体（严格按照官方文档格式）
         payload = {
@@ -109,16 +142,13 @@ class VideoGenerationMiniMax(BaseAtomicTool):
             "resolution": resolution
         }
 
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
         logger.info(f"调用 MiniMax Video Generation API: model={model}, duration={duration}s, resolution={resolution}")
 
-        response = requests.post(
+        # 限流/网关类错误按全抖动指数退避重试
+        response = post_with_retry(
+            self._session,
             self.api_url,
-            headers=headers,
+            headers=self._json_headers,
             json=payload,
             timeout=self.timeout
         )
@@ -128,7 +158,7 @@ class VideoGenerationMiniMax(BaseAtomicTool):
             logger.error(error_msg)
             raise RuntimeError(error_msg)
 
-        result = response.json()
+        result = fast_json.loads(response.content)
 
         # 检查 base_resp.status_code
         base_resp = result.get("base_resp", {})
@@ -142,10 +172,8 @@ class VideoGenerationMiniMax(BaseAtomicTool):
 
         # 情况1: 直接返回视频URL（同步，较少见）
         if video_url:
-            video_data = self._download_video(video_url)
-            if video_data:
-                file_path = work_dir / filename
-                file_path.write_bytes(video_data)
+            file_path = work_dir / filename
+            if self._download_video(video_url, file_path):
                 logger.info(f"视频下载成功: {filename}")
 
                 return {
@@ -161,13 +189,11 @@ class VideoGenerationMiniMax(BaseAtomicTool):
         # 情况2: 返回task_id，需要轮询（异步，通常情况）
         elif task_id:
             logger.info(f"视频生成任务已提交，task_id={task_id}，开始轮询...")
-            video_url = self._poll_task_result(task_id, headers)
+            video_url = self._poll_task_result(task_id)
 
             if video_url:
-                video_data = self._download_video(video_url)
-                if video_data:
-                    file_path = work_dir / filename
-                    file_path.write_bytes(video_data)
+                file_path = work_dir / filename
+                if self._download_video(video_url, file_path):
                     logger.info(f"视频生成并下载成功: {filename}")
 
                     return {
@@ -186,27 +212,33 @@ class VideoGenerationMiniMax(BaseAtomicTool):
         else:
             raise RuntimeError("未能从响应中提取task_id或video_url")
 
-    def _poll_task_result(self, task_id: str, headers: dict) -> Optional[str]:
+    def _poll_task_result(self, task_id: str) -> Optional[str]:
         """轮询任务结果，返回视频URL"""
-        # 查询端点通常是 /query 或 /task/{task_id}
-        query_url = f"{self.api_url.replace('/video_generation', '')}/query"
-
-        for attempt in range(self.max_poll_attempts):
+        # 视频提前完成时尽快发现，长任务则逐步拉长间隔以减少无效查询
+        start = time.monotonic()
+        deadline = start + self.poll_timeout
+        delay = self._POLL_FIRST_DELAY + random.uniform(0, self._POLL_JITTER)
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(min(delay, remaining))
+            delay = min(delay * self._POLL_BACKOFF, self._POLL_MAX_DELAY) + random.uniform(-self._POLL_JITTER, self._POLL_JITTER)
+            attempt += 1
             try:
-                time.sleep(self.poll_interval)
-
-                response = requests.get(
-                    query_url,
-                    headers=headers,
+                response = self._session.get(
+                    self.query_url,
+                    headers=self._json_headers,
                     params={"task_id": task_id},
                     timeout=30
                 )
 
                 if response.status_code != 200:
-                    logger.warning(f"轮询失败 (尝试 {attempt + 1}/{self.max_poll_attempts}): HTTP {response.status_code}")
+                    logger.warning(f"轮询失败 (第{attempt}次, 已等待{time.monotonic() - start:.0f}秒): HTTP {response.status_code}")
                     continue
 
-                result = response.json()
+                result = fast_json.loads(response.content)
 
                 # 检查 base_resp
                 base_resp = result.get("base_resp", {})
@@ -214,45 +246,47 @@ class VideoGenerationMiniMax(BaseAtomicTool):
                     logger.warning(f"轮询API错误: {base_resp.get('status_msg')}")
                     continue
 
-                status = result.get("data", {}).get("status")
-                video_url = result.get("data", {}).get("video_url")
+                data = result.get("data") or {}
+                status = data.get("status") or ""
 
-                if status == "completed" or status == "Success":
+                if status in self._STATUS_DONE:
+                    video_url = data.get("video_url")
                     if video_url:
                         logger.info(f"视频生成完成，获取到URL")
                         return video_url
-                elif status == "failed" or status == "Failed":
-                    error_msg = result.get("data", {}).get("error_message", "未知错误")
+                elif status in self._STATUS_FAILED:
+                    error_msg = data.get("error_message", "未知错误")
                     logger.error(f"视频生成失败: {error_msg}")
                     return None
-                elif status in ["pending", "processing", "Processing", "Pending"]:
-                    logger.info(f"视频生成中... (尝试 {attempt + 1}/{self.max_poll_attempts}, status={status})")
+                elif status in self._STATUS_PENDING:
+                    logger.info(f"视频生成中... (第{attempt}次, 已等待{time.monotonic() - start:.0f}秒, status={status})")
                     continue
 
             except Exception as e:
-                logger.warning(f"轮询异常 (尝试 {attempt + 1}/{self.max_poll_attempts}): {e}")
+                logger.warning(f"轮询异常 (第{attempt}次, 已等待{time.monotonic() - start:.0f}秒): {e}")
                 continue
 
-        logger.error(f"轮询超时: 超过 {self.max_poll_attempts * self.poll_interval} 秒未完成")
+        logger.error(f"轮询超时: 超过 {self.poll_timeout} 秒未完成")
         return None
 
-    def _download_video(self, video_url: str) -> Optional[bytes]:
-        """下载视频文件"""
+    def _download_video(self, video_url: str, file_path: Path) -> bool:
+        """流式下载视频文件到file_path，返回是否成功
+
+        响应体由shutil.copyfileobj按1MiB分块从连接直接拷贝到文件，不在内存中保留整段视频；
+        下载完成后才原子替换为目标文件，中途失败不留残缺文件。
+        """
         try:
             logger.info(f"下载视频: {video_url}")
-            response = requests.get(video_url, timeout=120, stream=True)
-
-            if response.status_code == 200:
-                # 流式下载，避免内存问题
-                content = b""
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        content += chunk
-                return content
-            else:
-                logger.error(f"下载视频失败: HTTP {response.status_code}")
-                return None
+            with self._session.get(video_url, timeout=120, stream=True) as response:
+                if response.status_code != 200:
+                    logger.error(f"下载视频失败: HTTP {response.status_code}")
+                    return False
+
+                response.raw.decode_content = True
+                with atomic_open(file_path) as f:
+                    shutil.copyfileobj(response.raw, f, length=1 << 20)
+            return True
 
         except Exception as e:
             logger.error(f"下载视频异常: {e}")
-            return None
+            return False
@@ -24,11 +24,15 @@ from __future__ import annotations
 from pathlib import Path
 from typing import Dict, Any, Optional
 import os
-import requests
+from concurrent.futures import ThreadPoolExecutor
 import time
 import base64
 
 from src.tools.base import BaseAtomicTool, ToolStatus
+from src.utils import fast_json
+from src.utils.dir_cache import ensure_dir
+from src.utils.http_retry import post_with_retry
+from src.utils.http_session import create_session
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -80,9 +84,43 @@ class VoiceCloneMiniMax(BaseAtomicTool):
         self.api_key = config.minimax_api_key
         self.upload_url = "https://api.minimaxi.com/v1/files/upload"
         self.clone_url = "https://api.minimaxi.com/v1/voice_clone"
+        # 请求头每个实例只构建一次
+        self._auth_headers = {"Authorization": f"Bearer {self.api_key}"}
+        self._json_headers = {**self._auth_headers, "Content-Type": "application/json"}
         self.timeout = 180  # 克隆可能较慢
         self.output_dir = config.output_dir
         self.conv_manager = conv_manager
+        # 上传/克隆/试听下载共用连接池。适配器层不重试：POST由post_with_retry重试，
+        # 叠加适配器的建连重试会使每次上传的建连次数成倍放大
+        self._session = create_session(4, 32)
+
+    def _upload_file(self, path: Path, purpose: str) -> str:
+        """上传音频文件，返回file_id
+
+        Args:
+            path: 音频文件路径
+            purpose: 上传用途（voice_clone/prompt_audio）
+
+        Raises:
+            RuntimeError: 响应中没有file_id
+        """
+        # 无缓冲打开：requests组装multipart时一次性读取整个文件，不需要BufferedReader中转
+        with open(path, "rb", buffering=0) as f:
+            response = post_with_retry(
+                self._session,
+                self.upload_url,
+                headers=self._auth_headers,
+                data={"purpose": purpose},
+                files={"file": (path.name, f)},
+                timeout=60
+            )
+        response.raise_for_status()
+
+        result = fast_json.loads(response.content)
+        file_id = result.get("file", {}).get("file_id")
+        if not file_id:
+            raise RuntimeError(f"上传失败: {result}")
+        return file_id
 
     def execute(self, **kwargs) -> Dict[str, Any]:
         """执行音色克隆的核心逻辑"""
@@ -104,8 +142,11 @@ class VoiceCloneMiniMax(BaseAtomicTool):
             raise RuntimeError("缺少 MINIMAX_API_KEY 环境变量")
 
         # 检查音频文件是否存在
+        # 一次stat同时完成存在性检查与大小获取
         audio_path = Path(audio_file)
-        if not audio_path.exists():
+        try:
+            file_size = audio_path.stat().st_size
+        except FileNotFoundError:
             raise RuntimeError(f"音频文件不存在: {audio_file}")
 
         # 检查文件格式和大小
@@ -113,65 +154,36 @@ class VoiceCloneMiniMax(BaseAtomicTool):
         if file_ext not in ['.mp3', '.m4a', '.wav']:
             raise RuntimeError(f"不支持的音频格式: {file_ext}，仅支持 mp3/m4a/wav")
 
-        file_size = audio_path.stat().st_size
         if file_size > 20 * 1024 * 1024:  # 20MB
             raise RuntimeError(f"文件过大: {file_size / 1024 / 1024:.1f}MB，最大支持20MB")
 
         logger.info(f"开始音色克隆: audio_file={audio_file}, voice_id={voice_id}")
 
-        # 步骤1：上传克隆音频
-        logger.info("步骤1: 上传克隆音频...")
-        with open(audio_path, "rb") as f:
-            files = {"file": (audio_path.name, f)}
-            data = {"purpose": "voice_clone"}
-            headers = {"Authorization": f"Bearer {self.api_key}"}
-
-            response = requests.post(
-                self.upload_url,
-                headers=headers,
-                data=data,
-                files=files,
-                timeout=60
-            )
-            response.raise_for_status()
-
-        result = response.json()
-        file_id = result.get("file", {}).get("file_id")
-
-        if not file_id:
-            raise RuntimeError(f"上传失败: {result}")
-
-        logger.info(f"克隆音频上传成功: file_id={file_id}")
-
-        # 步骤2：上传示例音频（可选）
-        prompt_file_id = None
+        # 示例音频（可选）
+        prompt_path = None
         if prompt_audio:
-            logger.info("步骤2: 上传示例音频...")
             prompt_path = Path(prompt_audio)
             if not prompt_path.exists():
                 logger.warning(f"示例音频文件不存在，跳过: {prompt_audio}")
-            else:
+                prompt_path = None
+
+        # 步骤1/2：上传克隆音频与示例音频（两者互不依赖，有示例音频时并发上传）
+        prompt_file_id = None
+        if prompt_path:
+            logger.info("步骤1/2: 并发上传克隆音频与示例音频...")
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                prompt_future = pool.submit(self._upload_file, prompt_path, "prompt_audio")
+                file_id = self._upload_file(audio_path, "voice_clone")
                 try:
-                    with open(prompt_path, "rb") as f:
-                        files = {"file": (prompt_path.name, f)}
-                        data = {"purpose": "prompt_audio"}
-                        headers = {"Authorization": f"Bearer {self.api_key}"}
-
-                        response = requests.post(
-                            self.upload_url,
-                            headers=headers,
-                            data=data,
-                            files=files,
-                            timeout=60
-                        )
-                        response.raise_for_status()
-
-                    result = response.json()
-                    prompt_file_id = result.get("file", {}).get("file_id")
+                    prompt_file_id = prompt_future.result()
                     logger.info(f"示例音频上传成功: file_id={prompt_file_id}")
-
                 except Exception as e:
                     logger.warning(f"上传示例音频失败，继续克隆: {str(e)}")
+        else:
+            logger.info("步骤1: 上传克隆音频...")
+            file_id = self._upload_file(audio_path, "voice_clone")
+
+        logger.info(f"克隆音频上传成功: file_id={file_id}")
 
         # 步骤3：执行音色克隆
         logger.info(f"步骤3: 执行音色克隆 (voice_id={voice_id})...")
@@ -190,20 +202,17 @@ class VoiceCloneMiniMax(BaseAtomicTool):
                 "prompt_text": prompt_text
             }
 
-        clone_headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
-        response = requests.post(
+        # 限流/网关类错误按全抖动指数退避重试
+        response = post_with_retry(
+            self._session,
             self.clone_url,
-            headers=clone_headers,
+            headers=self._json_headers,
             json=payload,
             timeout=self.timeout
         )
         response.raise_for_status()
 
-        result = response.json()
+        result = fast_json.loads(response.content)
         logger.info(f"克隆响应: {result}")
 
         # 检查响应
@@ -222,16 +231,15 @@ class VoiceCloneMiniMax(BaseAtomicTool):
             logger.info("步骤4: 下载试听音频...")
             try:
                 # 下载试听音频
-                audio_response = requests.get(demo_audio_url, timeout=30)
+                audio_response = self._session.get(demo_audio_url, timeout=30)
                 audio_response.raise_for_status()
 
                 # 保存到输出目录
                 if not self.conv_manager:
                     logger.warning("缺少conv_manager，试听音频未保存")
                 else:
-                    output_dir_name = self.conv_manager.get_output_dir_name(conv_id)
-                    work_dir = self.output_dir / output_dir_name
-                    work_dir.mkdir(parents=True, exist_ok=True)
+                    output_dir_name = self._get_output_dir_name(conv_id)
+                    work_dir = ensure_dir(self.output_dir / output_dir_name)
 
                     sample_filename = f"voice_sample_{voice_id}.mp3"
                     sample_path = work_dir / sample_filename
@@ -2,17 +2,28 @@
 
 支持Tavily和Serper两个搜索引擎，Tavily为主，Serper为备用。
 Tavily支持双账号配置，当主账号额度用尽时自动切换到副账号。
+两者都已配置时，Tavily响应过慢会并发发起Serper，取先成功的结果。
 """
 
+import os
+import threading
+import time
 import requests
 import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, Optional
 from src.tools.base import BaseAtomicTool
+from src.utils import fast_json
+from src.utils.http_session import create_session, idempotent_retry
 from src.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# 对冲请求的执行线程，所有实例共享（落后的请求在后台跑完，不阻塞调用方）
+_HEDGE_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="web_search")
+
 
 class WebSearchTool(BaseAtomicTool):
     """Web搜索工具
@@ -45,6 +56,16 @@ class WebSearchTool(BaseAtomicTool):
         self.tavily_key_secondary = config.tavily_api_key_secondary
         self.serper_key = config.serper_api_key
         self.timeout = 15
+        # Tavily/Serper共用连接池。每次搜索按次计费，只在请求未被受理（502/503、建连失败）时重试一次，
+        # 504与读超时时服务端可能已完成搜索，重试会重复计费。429不重试：由额度判断逻辑切换账号
+        self._session = create_session(
+            4, 32, idempotent_retry(total=1, methods=("POST",), status_forcelist=(502, 503), retry_reads=False)
+        )
+        # 对冲搜索：Tavily超过该时长（秒）未返回时并发发起Serper
+        self.hedge_delay = float(os.getenv("WEB_SEARCH_HEDGE_DELAY", "2"))
+        # (query, max_results, search_depth) -> (写入时间, 结果)，按最近使用排序
+        self._cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
 
         # 状态文件路径（记录当前使用的Tavily key）
         # 用于多实例共享"已知主账号额度用尽"的状态
@@ -52,6 +73,10 @@ class WebSearchTool(BaseAtomicTool):
         self._current_tavily_key = None
         self._load_state()
 
+    # 搜索结果缓存：最多保留的查询数与有效期（秒）
+    _CACHE_SIZE = 256
+    _CACHE_TTL = 60
+
     def _load_state(self):
         """从状态文件加载当前使用的Tavily key
 
@@ -117,70 +142,152 @@ class WebSearchTool(BaseAtomicTool):
         Returns:
             搜索结果字典
         """
+        # 短时间内的重复查询（如重新规划时）直接返回缓存结果，省去一次计费的API调用
+        key = (query, max_results, search_depth)
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self._CACHE_TTL:
+                self._cache.move_to_end(key)
+                logger.info(f"命中搜索缓存: query='{query}'")
+                return {**entry[1], "cache_hit": True}
+
+        result = self._search(query, max_results, search_depth)
+
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic(), result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return {**result, "cache_hit": False}
+
+    def _search(self, query: str, max_results: int, search_depth: str) -> Dict[str, Any]:
+        """依次/对冲调用搜索引擎（不经过缓存）"""
+        # Tavily与Serper都可用时，Tavily迟迟未返回则同时发起Serper，取先成功者
+        if self._current_tavily_key and self.serper_key:
+            return self._hedged_search(query, max_results, search_depth)
+
         # 优先使用Tavily（支持双账号自动切换）
         if self._current_tavily_key:
-            current_key_type = "primary" if self._current_tavily_key == self.tavily_key_primary else "secondary"
-
-            # 尝试使用当前Tavily key
-            try:
-                logger.info(f"使用Tavily {current_key_type}账号搜索: query='{query}'")
-                return self._tavily_search(query, max_results, search_depth, self._current_tavily_key)
-
-            except requests.exceptions.HTTPError as e:
-                # 检查是否是额度用尽错误
-                status_code = e.response.status_code if hasattr(e.response, 'status_code') else 0
-                error_msg = str(e)
-
-                # 尝试解析错误响应
-                try:
-                    error_data = e.response.json() if hasattr(e.response, 'json') else {}
-                    error_detail = error_data.get('error', '') + ' ' + error_data.get('detail', '')
-                except:
-                    error_detail = error_msg
-
-                # 判断是否是额度/限制错误
-                is_quota_error = (
-                    status_code == 429 or  # Too Many Requests
-                    status_code == 402 or  # Payment Required
-                    "quota" in error_detail.lower() or
-                    "limit" in error_detail.lower() or
-                    "credit" in error_detail.lower() or
-                    "exceeded" in error_detail.lower()
-                )
-
-                if is_quota_error:
-                    logger.warning(f"Tavily {current_key_type}账号额度用尽或受限: {error_detail}")
-
-                    # 如果有备用key，尝试切换
-                    if self._switch_tavily_key():
-                        try:
-                            new_key_type = "primary" if self._current_tavily_key == self.tavily_key_primary else "secondary"
-                            logger.info(f"切换到Tavily {new_key_type}账号重试: query='{query}'")
-                            return self._tavily_search(query, max_results, search_depth, self._current_tavily_key)
-                        except Exception as e2:
-                            logger.warning(f"备用Tavily账号也失败: {str(e2)}, 切换到Serper")
-                    else:
-                        logger.warning("没有可用的备用Tavily账号")
-                else:
-                    # 非额度问题的错误，直接抛出
-                    logger.error(f"Tavily搜索失败（非额度问题）: {error_detail}")
-                    raise
-
-            except Exception as e:
-                # 其他非HTTP错误
-                logger.error(f"Tavily搜索异常: {str(e)}")
-                raise
+            result = self._tavily_search_with_failover(query, max_results, search_depth)
+            if result is not None:
+                return result
 
         # 回退到Serper
         if self.serper_key:
+            return self._serper_search_logged(query, max_results)
+
+        raise RuntimeError("没有可用的搜索引擎API")
+
+    def _hedged_search(self, query: str, max_results: int, search_depth: str) -> Dict[str, Any]:
+        """Tavily优先的对冲搜索
+
+        先只发起Tavily；hedge_delay秒内有结果则直接返回（与顺序回退行为一致）。
+        超时未返回时再并发发起Serper，两者中先成功的结果即为最终结果，
+        尾延迟从 t_tavily + t_serper 降到 min(t_tavily, t_serper)，
+        而Tavily正常返回时不额外消耗Serper额度。
+
+        错误处理与顺序回退一致，不论发生在hedge_delay之前还是之后：
+        Tavily额度用尽时使用Serper的结果；Tavily非额度错误直接抛出。
+        """
+        tavily_future = _HEDGE_EXECUTOR.submit(self._tavily_search_with_failover, query, max_results, search_depth)
+        try:
+            result = tavily_future.result(timeout=self.hedge_delay)
+        except FutureTimeoutError:
+            pass
+        else:
+            if result is not None:
+                return result
+            return self._serper_search_logged(query, max_results)
+
+        logger.info(f"Tavily {self.hedge_delay}秒内未返回，同时发起Serper搜索: query='{query}'")
+        serper_future = _HEDGE_EXECUTOR.submit(self._serper_search_logged, query, max_results)
+
+        # 落后的请求无法中断，由线程池在后台跑完，其结果被丢弃
+        serper_error = None
+        for future in as_completed((tavily_future, serper_future)):
+            if future is tavily_future:
+                result = future.result()
+                if result is not None:
+                    return result
+                continue
             try:
-                logger.info(f"使用Serper搜索: query='{query}'")
-                return self._serper_search(query, max_results)
+                return future.result()
             except Exception as e:
-                logger.error(f"Serper搜索失败: {str(e)}")
+                serper_error = e
+
+        # 走到这里说明Tavily额度用尽且Serper失败
+        raise serper_error
+
+    def _tavily_search_with_failover(self, query: str, max_results: int, search_depth: str) -> Optional[Dict[str, Any]]:
+        """使用当前Tavily账号搜索，额度用尽时切换账号重试
+
+        Returns:
+            搜索结果；额度用尽且备用账号不可用时返回None（由调用方回退到Serper）
+
+        Raises:
+            非额度问题的错误直接抛出
+        """
+        current_key_type = "primary" if self._current_tavily_key == self.tavily_key_primary else "secondary"
+
+        # 尝试使用当前Tavily key
+        try:
+            logger.info(f"使用Tavily {current_key_type}账号搜索: query='{query}'")
+            return self._tavily_search(query, max_results, search_depth, self._current_tavily_key)
+
+        except requests.exceptions.HTTPError as e:
+            # 检查是否是额度用尽错误
+            status_code = e.response.status_code if hasattr(e.response, 'status_code') else 0
+            error_msg = str(e)
+
+            # 尝试解析错误响应
+            try:
+                error_data = e.response.json() if hasattr(e.response, 'json') else {}
+                error_detail = error_data.get('error', '') + ' ' + error_data.get('detail', '')
+            except:
+                error_detail = error_msg
+
+            # 判断是否是额度/限制错误
+            is_quota_error = (
+                status_code == 429 or  # Too Many Requests
+                status_code == 402 or  # Payment Required
+                "quota" in error_detail.lower() or
+                "limit" in error_detail.lower() or
+                "credit" in error_detail.lower() or
+                "exceeded" in error_detail.lower()
+            )
+
+            if is_quota_error:
+                logger.warning(f"Tavily {current_key_type}账号额度用尽或受限: {error_detail}")
+
+                # 如果有备用key，尝试切换
+                if self._switch_tavily_key():
+                    try:
+                        new_key_type = "primary" if self._current_tavily_key == self.tavily_key_primary else "secondary"
+                        logger.info(f"切换到Tavily {new_key_type}账号重试: query='{query}'")
+                        return self._tavily_search(query, max_results, search_depth, self._current_tavily_key)
+                    except Exception as e2:
+                        logger.warning(f"备用Tavily账号也失败: {str(e2)}, 切换到Serper")
+                else:
+                    logger.warning("没有可用的备用Tavily账号")
+                return None
+            else:
+                # 非额度问题的错误，直接抛出
+                logger.error(f"Tavily搜索失败（非额度问题）: {error_detail}")
                 raise
 
-        raise RuntimeError("没有可用的搜索引擎API")
+        except Exception as e:
+            # 其他非HTTP错误
+            logger.error(f"Tavily搜索异常: {str(e)}")
+            raise
+
+    def _serper_search_logged(self, query: str, max_results: int) -> Dict[str, Any]:
+        """使用Serper搜索（记录日志）"""
+        try:
+            logger.info(f"使用Serper搜索: query='{query}'")
+            return self._serper_search(query, max_results)
+        except Exception as e:
+            logger.error(f"Serper搜索失败: {str(e)}")
+            raise
 
     def _tavily_search(self, query: str, max_results: int, search_depth: str, api_key: str) -> Dict[str, Any]:
         """使用Tavily API搜索
@@ -207,9 +314,9 @@ class WebSearchTool(BaseAtomicTool):
             "include_raw_content": False
         }
 
-        response = requests.post(url, headers=headers, json=payload, timeout=self.timeout)
+        response = self._session.post(url, headers=headers, json=payload, timeout=self.timeout)
         response.raise_for_status()
-        data = response.json()
+        data = fast_json.loads(response.content)
 
         # 标准化返回格式
         results = []
@@ -249,9 +356,9 @@ class WebSearchTool(BaseAtomicTool):
             "num": max_results
         }
 
-        response = requests.post(url, headers=headers, json=payload, timeout=self.timeout)
+        response = self._session.post(url, headers=headers, json=payload, timeout=self.timeout)
         response.raise_for_status()
-        data = response.json()
+        data = fast_json.loads(response.content)
 
         # 标准化返回格式
         results = []
@@ -44,6 +44,20 @@ class BaseAtomicTool(ABC):
         """
         self.config = config
         self.status = ToolStatus.PENDING
+        self._output_dir_names: Dict[str, str] = {}  # conv_id -> 输出目录名
+
+    def _get_output_dir_name(self, conv_id: str) -> str:
+        """获取会话输出目录名（需子类持有conv_manager）
+
+        目录名在会话生命周期内不变，按conv_id缓存；
+        未登记的会话会回退为conv_id本身，这种结果不缓存。
+        """
+        name = self._output_dir_names.get(conv_id)
+        if name is None:
+            name = self.conv_manager.get_output_dir_name(conv_id)
+            if name != conv_id:
+                self._output_dir_names[conv_id] = name
+        return name
 
     @abstractmethod
     def execute(self, **kwargs) -> Dict[str, Any]:
@@ -0,0 +1,36 @@
+"""原子写文件模块
+
+生成的媒体文件先写入同目录下的临时文件，完整写完后用os.replace原子替换为目标文件：
+- 前端预览/文件列表不会看到写了一半的文件
+- 写入失败时不留下残缺文件，也不破坏已存在的同名文件
+- 配合大缓冲区，在网络文件系统上以较少的大块写入落盘
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, Union
+
+
+@contextmanager
+def atomic_open(path: Union[str, Path], buffering: int = 1 << 20) -> Iterator[BinaryIO]:
+    """以二进制写模式打开path的临时文件，正常退出后原子替换为path
+
+    Args:
+        path: 目标文件路径
+        buffering: 写缓冲区大小
+
+    Yields:
+        临时文件对象（异常退出时临时文件被删除，目标文件保持不变）
+    """
+    path = Path(path)
+    # 隐藏临时文件，名称带进程/线程标识，并发写同一目标时互不干扰
+    tmp = path.with_name(f".{path.name}.{os.getpid()}_{threading.get_ident()}.partial")
+    try:
+        with open(tmp, "wb", buffering=buffering) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
@@ -41,6 +41,8 @@ class Config:
         # URL Fetch APIs
         self.firecrawl_api_key = os.getenv("FIRECRAWL_API_KEY", "")
         # Jina Reader无需API Key
+        # 抓取结果缓存有效期(秒)，0表示不使用缓存
+        self.url_fetch_cache_ttl = int(os.getenv("URL_FETCH_CACHE_TTL", "86400"))
 
         # LLM API - 统一接入点
         self.agent_model_api_key = os.getenv("AGENT_MODEL_API_KEY", "")
@@ -17,7 +17,7 @@ data/
 import json
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import re
 import uuid
 
@@ -633,6 +633,30 @@ class ConversationManagerV2:
             view_count: 查看次数限制（默认1次，查看后自动移除）
             username: 用户名（权限校验）
 
+        Returns:
+            是否成功
+        """
+        return self.add_images_to_view_multi(
+            conv_id,
+            {(detail, view_count): image_paths},
+            username=username
+        )
+
+    def add_images_to_view_multi(
+        self,
+        conv_id: str,
+        groups: Dict[Tuple[str, int], List[str]],
+        replace: bool = False,
+        username: str | None = None
+    ) -> bool:
+        """批量添加多组图片到LLM查看列表（一次读写对话文件）
+
+        Args:
+            conv_id: 对话ID
+            groups: {(detail, view_count): [图片路径, ...]}
+            replace: 是否先清空现有列表再添加
+            username: 用户名（权限校验）
+
         Returns:
             是否成功
         """
@@ -640,6 +664,9 @@ class ConversationManagerV2:
         if not conv:
             return False
 
+        if replace:
+            conv["pending_images"] = []
+
         # 确保pending_images字段存在
         if "pending_images" not in conv:
             conv["pending_images"] = []
@@ -657,13 +684,15 @@ class ConversationManagerV2:
 
         # 添加图片（去重）
         existing_paths = {img["path"] for img in conv["pending_images"]}
-        for path in image_paths:
-            if path not in existing_paths:
-                conv["pending_images"].append({
-                    "path": path,
-                    "detail": detail,
-                    "remaining_views": max(1, view_count)  # 至少1次
-                })
+        for (detail, view_count), image_paths in groups.items():
+            for path in image_paths:
+                if path not in existing_paths:
+                    existing_paths.add(path)
+                    conv["pending_images"].append({
+                        "path": path,
+                        "detail": detail,
+                        "remaining_views": max(1, view_count)  # 至少1次
+                    })
 
         # 保存对话文件
         conv_path = self._get_conv_path(conv_id)
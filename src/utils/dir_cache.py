@@ -0,0 +1,29 @@
+"""目录创建缓存模块
+
+工具每次执行都要确保会话输出目录存在。输出目录在服务运行期间不会被删除，
+因此按路径缓存已创建的目录，同一路径在进程内只执行一次mkdir。
+"""
+
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Union
+
+
+@lru_cache(maxsize=1024)
+def _ensure_dir_cached(path_str: str) -> Path:
+    path = Path(path_str)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def ensure_dir(path: Union[str, Path]) -> Path:
+    """确保目录存在（同一路径进程内只创建一次）
+
+    Args:
+        path: 目录路径
+
+    Returns:
+        目录Path对象
+    """
+    return _ensure_dir_cached(os.fspath(path))
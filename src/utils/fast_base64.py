@@ -0,0 +1,31 @@
+"""base64快速解码模块
+
+优先使用pybase64（可选依赖，SIMD加速，解码速度约为标准库的数倍），
+未安装时回退到标准库binascii，接口保持一致。
+用于解码外部API响应中携带的大段图像/音频数据。
+"""
+
+import binascii
+from typing import Union
+
+# pybase64支持（可选依赖）
+try:
+    import pybase64
+    PYBASE64_SUPPORT = True
+except ImportError:
+    pybase64 = None
+    PYBASE64_SUPPORT = False
+
+
+def b64decode(data: Union[bytes, str]) -> bytes:
+    """解码标准base64
+
+    Args:
+        data: base64字节串或字符串（需已补齐padding，换行等非字母表字符会被忽略）
+
+    Returns:
+        解码后的字节串
+    """
+    if PYBASE64_SUPPORT:
+        return pybase64.b64decode(data, validate=False)
+    return binascii.a2b_base64(data)
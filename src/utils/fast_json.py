@@ -0,0 +1,50 @@
+"""JSON快速编解码模块
+
+优先使用orjson（可选依赖），未安装时回退到标准库json，接口保持一致。
+用于请求体较大或响应中携带大段编码数据的外部API调用。
+"""
+
+import json
+from typing import Any, Union
+
+# orjson支持（可选依赖）
+try:
+    import orjson
+    ORJSON_SUPPORT = True
+except ImportError:
+    orjson = None
+    ORJSON_SUPPORT = False
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """序列化为UTF-8编码的JSON字节串
+
+    Args:
+        obj: 待序列化对象
+        indent: 是否以2空格缩进输出（用于写入供人阅读的文件）
+
+    Returns:
+        JSON字节串（非ASCII字符不转义，默认紧凑格式，两种实现输出一致）
+    """
+    if ORJSON_SUPPORT:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2) if indent else orjson.dumps(obj)
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """反序列化JSON
+
+    Args:
+        data: JSON字节串或字符串
+
+    Returns:
+        解析后的对象
+
+    Raises:
+        ValueError: JSON格式错误
+    """
+    if ORJSON_SUPPORT:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,112 @@
+"""HTTP POST重试模块
+
+MiniMax等外部API在负载高峰时常返回429/502/503，这类错误重试即可恢复。
+对POST请求按全抖动指数退避重试（每次等待 uniform(0, min(上限, 基数×2^n)) 秒），
+既提高成功率，也避免多个并发客户端同时重试造成新的请求尖峰。
+
+视频生成、音色克隆等POST是计费操作，只重试请求未被服务端受理的情况：
+- 状态码429/502/503：限流或网关未能转发
+- 建连失败：连接超时、连接被拒绝等，请求体尚未发出
+500/504、读超时、请求发出后连接被断开等情况服务端可能已在处理，重试会重复提交任务，直接交给调用方。
+"""
+
+import random
+import time
+from typing import Any, Optional
+
+import requests
+from urllib3.exceptions import ConnectTimeoutError, MaxRetryError
+
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 可重试的HTTP状态码（计费POST统一策略：500/504时服务端可能已受理，不重试）
+RETRY_STATUSES = frozenset((429, 502, 503))
+
+# Retry-After头指定的等待时长上限（秒）
+_MAX_RETRY_AFTER = 30.0
+
+
+def post_with_retry(
+    session: requests.Session,
+    url: str,
+    *,
+    max_attempts: int = 5,
+    base_delay: float = 0.5,
+    max_delay: float = 8.0,
+    **kwargs: Any,
+) -> requests.Response:
+    """发送POST请求，遇到可重试错误时按全抖动指数退避重试
+
+    Args:
+        session: 发送请求的Session
+        url: 请求地址
+        max_attempts: 最大尝试次数
+        base_delay: 退避基数（秒）
+        max_delay: 单次退避上限（秒）
+        **kwargs: 透传给session.post的参数（files中的文件对象每次尝试前回到开头）
+
+    Returns:
+        最后一次请求的响应（状态码可能仍是可重试错误，由调用方处理）
+
+    Raises:
+        requests.exceptions.RequestException: 建连失败且重试用尽，或其他不可重试的请求异常
+    """
+    attempt = 1
+    while True:
+        _rewind_files(kwargs.get("files"))
+        retry_after = None
+        try:
+            response = session.post(url, **kwargs)
+        except requests.exceptions.ConnectionError as e:
+            if not _is_connect_failure(e) or attempt >= max_attempts:
+                raise
+            logger.warning(f"POST建连失败 (尝试 {attempt}/{max_attempts}): {url}, {e}")
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt >= max_attempts:
+                return response
+            logger.warning(f"POST返回HTTP {response.status_code} (尝试 {attempt}/{max_attempts}): {url}")
+            retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+            response.close()
+
+        delay = random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        time.sleep(delay)
+        attempt += 1
+
+
+def _is_connect_failure(error: requests.exceptions.ConnectionError) -> bool:
+    """是否为建连阶段的失败（请求体尚未发出，重试不会重复提交）
+
+    requests把"请求发出后连接被断开"（ProtocolError/RemoteDisconnected）也包装成ConnectionError，
+    这种情况服务端可能已收到请求，不视为建连失败。
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    # 连接被拒绝/DNS解析失败等（NewConnectionError是ConnectTimeoutError的子类）
+    return isinstance(reason, ConnectTimeoutError)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析秒数形式的Retry-After头（HTTP日期形式忽略）"""
+    if not value:
+        return None
+    try:
+        return min(max(float(value), 0.0), _MAX_RETRY_AFTER)
+    except ValueError:
+        return None
+
+
+def _rewind_files(files: Any) -> None:
+    """将multipart上传的文件对象移回开头，保证重试时发送完整内容"""
+    if not isinstance(files, dict):
+        return
+    for value in files.values():
+        fileobj = value[1] if isinstance(value, tuple) else value
+        if hasattr(fileobj, "seek"):
+            fileobj.seek(0)
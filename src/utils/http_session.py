@@ -0,0 +1,79 @@
+"""HTTP会话工厂模块
+
+外部API工具各自持有一个requests.Session：keep-alive复用TCP/TLS连接，省去每次调用的握手。
+连接池大小与重试策略由调用方传入，重试策略统一在本模块定义：
+
+- paid_retry: 计费接口（MiniMax生成类POST），只在请求未被受理时重试，读超时不重试
+- idempotent_retry: 幂等请求（查询、下载），网关类错误可放心重试
+"""
+
+from typing import Collection, Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from src.utils.http_retry import RETRY_STATUSES
+
+# 幂等请求的可重试状态码
+IDEMPOTENT_RETRY_STATUSES = frozenset((429, 502, 503, 504))
+
+
+def create_session(pool_connections: int, pool_maxsize: int, retry: Optional[Retry] = None) -> requests.Session:
+    """创建挂载了连接池与重试策略的Session
+
+    Args:
+        pool_connections: 缓存连接池的主机数
+        pool_maxsize: 每个主机的最大连接数
+        retry: 重试策略（None表示不重试）
+
+    Returns:
+        Session对象（http/https共用同一个适配器）
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry if retry is not None else 0,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def paid_retry(total: int, backoff_factor: float = 0.3, methods: Iterable[str] = ("POST",)) -> Retry:
+    """计费接口的重试策略
+
+    只在限流/网关未转发（429/502/503）及建连失败时重试；500/504与读超时时服务端可能已在处理，
+    重试会重复计费，不重试。
+    """
+    return Retry(
+        total=total,
+        read=False,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(methods),
+        raise_on_status=False,
+    )
+
+
+def idempotent_retry(
+    total: int,
+    backoff_factor: float = 0.3,
+    methods: Iterable[str] = ("GET",),
+    status_forcelist: Collection[int] = IDEMPOTENT_RETRY_STATUSES,
+    retry_reads: bool = True,
+) -> Retry:
+    """幂等请求的重试策略
+
+    网关类错误与建连失败可重试；retry_reads=False时读超时/读错误不重试，
+    直接以ReadTimeout等原始异常抛出（超时较长或有回退方案的调用方应关闭，避免等待时长成倍放大）。
+    """
+    return Retry(
+        total=total,
+        read=None if retry_reads else False,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+        allowed_methods=frozenset(methods),
+        raise_on_status=False,
+    )
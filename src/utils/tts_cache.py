@@ -0,0 +1,105 @@
+"""TTS合成结果磁盘缓存模块
+
+相同的(音色, 语速, 音高, 格式, 文本)合成结果是确定的，按参数摘要缓存到磁盘，
+重复合成（幻灯片重新生成、旁白重试等）时直接复制已有音频，省去整个网络往返。
+音乐生成工具也用restore/store读写自己的缓存目录。
+
+缓存命中时复制而非硬链接：输出文件可能被后续调用以同名覆盖写入，
+硬链接会让覆盖写入同时改坏缓存。
+
+每个缓存目录的总大小受TTS_CACHE_MAX_MB限制（默认200MB），超出时按最近使用时间淘汰。
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+from pathlib import Path
+
+from src.utils.dir_cache import ensure_dir
+from src.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# 单个缓存目录的容量上限（字节）
+_MAX_CACHE_BYTES = int(os.getenv("TTS_CACHE_MAX_MB", "200")) << 20
+
+
+def cache_path(cache_dir: Path, suffix: str, *fields) -> Path:
+    """根据合成参数计算缓存文件路径
+
+    Args:
+        cache_dir: 缓存目录
+        suffix: 文件后缀（含点，如 .mp3）
+        fields: 参与寻址的合成参数（文本放在最后）
+
+    Returns:
+        缓存文件路径（不保证存在）
+    """
+    key = hashlib.blake2b("|".join(map(str, fields)).encode("utf-8"), digest_size=16).hexdigest()
+    return cache_dir / f"{key}{suffix}"
+
+
+def restore(cached: Path, out_path: Path) -> bool:
+    """缓存命中时将缓存音频复制到out_path
+
+    Returns:
+        是否命中
+    """
+    try:
+        shutil.copyfile(cached, out_path)
+    except FileNotFoundError:
+        return False
+    # 刷新mtime作为最近使用时间，供容量淘汰参考
+    try:
+        os.utime(cached)
+    except OSError:
+        pass
+    return True
+
+
+def store(out_path: Path, cached: Path) -> None:
+    """将合成结果写入缓存（先写临时文件再原子替换，失败不影响主流程）"""
+    tmp = cached.with_name(f".{cached.name}.{os.getpid()}_{threading.get_ident()}.tmp")
+    try:
+        ensure_dir(cached.parent)
+        shutil.copyfile(out_path, tmp)
+        os.replace(tmp, cached)
+    except OSError as e:
+        logger.warning(f"写入音频缓存失败: {e}")
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        return
+    _prune(cached.parent, _MAX_CACHE_BYTES)
+
+
+def _prune(cache_dir: Path, max_bytes: int) -> None:
+    """缓存目录超出容量时，按mtime从旧到新删除文件直到低于上限"""
+    try:
+        entries = []
+        total = 0
+        with os.scandir(cache_dir) as it:
+            for entry in it:
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+    except OSError as e:
+        logger.warning(f"扫描音频缓存目录失败: {e}")
+        return
+    if total <= max_bytes:
+        return
+
+    entries.sort()
+    for _, size, path in entries:
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+        if total <= max_bytes:
+            break
+    logger.info(f"音频缓存超出容量上限，已淘汰至 {total >> 20}MB: {cache_dir}")
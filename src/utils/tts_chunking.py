@@ -0,0 +1,106 @@
+"""TTS长文本分段与音频拼接模块
+
+长旁白按句子边界切分为若干段并发合成，再将各段音频拼接为一个文件：
+- MP3: 帧序列可直接首尾相接
+- WAV(LINEAR16): 保留首段的格式头，合并各段data块并重写RIFF/data长度
+"""
+
+import re
+import struct
+from pathlib import Path
+from typing import Iterable, List, Tuple, Union
+
+from src.utils.atomic_write import atomic_open
+
+# 句末标点之后切分（零宽匹配，分段拼回即为原文；英文句点要求后跟空白，避免切开小数）
+_SENTENCE_END_RE = re.compile(r"(?<=[。！？!?；;])|(?<=\.)(?=\s)")
+
+# 支持分段拼接的输出格式
+CONCAT_FORMATS = frozenset(("mp3", "wav", "linear16"))
+
+
+def split_text(text: str, max_chars: int = 800) -> List[str]:
+    """按句子边界将文本切分为不超过max_chars的段
+
+    相邻短句会合并到同一段；单句超过max_chars时按长度硬切。
+
+    Args:
+        text: 待合成文本
+        max_chars: 每段最大字符数
+
+    Returns:
+        分段列表（文本不超过max_chars时只有一段）
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks: List[str] = []
+    current = ""
+    for sentence in _SENTENCE_END_RE.split(text):
+        if not sentence:
+            continue
+        if len(current) + len(sentence) <= max_chars:
+            current += sentence
+            continue
+        if current:
+            chunks.append(current)
+        while len(sentence) > max_chars:
+            chunks.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        current = sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _locate_wav_data(data: bytes) -> Tuple[int, int]:
+    """定位WAV的data块，返回(PCM数据起始偏移, PCM数据长度)
+
+    Raises:
+        ValueError: 不是合法的RIFF/WAVE数据或缺少data块
+    """
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise ValueError("不是有效的WAV数据")
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        (size,) = struct.unpack_from("<I", data, pos + 4)
+        if chunk_id == b"data":
+            return pos + 8, min(size, len(data) - pos - 8)
+        pos += 8 + size + (size & 1)
+    raise ValueError("WAV数据缺少data块")
+
+
+def write_concat_audio(path: Union[str, Path], parts: Iterable[bytes], fmt: str) -> None:
+    """将多段同格式音频按序拼接写入文件
+
+    逐段写入缓冲文件，不在内存中拼出完整音频；parts可为生成器，一次只持有一段。
+    全部写完后才原子替换为目标文件，任一段失败不会留下残缺音频。
+
+    Args:
+        path: 输出文件路径
+        parts: 各段音频字节（按播放顺序）
+        fmt: 音频格式（见CONCAT_FORMATS）
+    """
+    with atomic_open(path) as f:
+        if fmt == "mp3":
+            for part in parts:
+                f.write(part)
+            return
+
+        # WAV：先写首段的格式头占位，写完全部PCM后回填RIFF/data长度
+        header = None
+        data_size = 0
+        for part in parts:
+            offset, size = _locate_wav_data(part)
+            if header is None:
+                header = bytearray(part[:offset])
+                f.write(header)
+            f.write(memoryview(part)[offset:offset + size])
+            data_size += size
+        if header is None:
+            return
+        struct.pack_into("<I", header, 4, len(header) - 8 + data_size)
+        struct.pack_into("<I", header, len(header) - 4, data_size)
+        f.seek(0)
+        f.write(header)